@@ -0,0 +1,87 @@
+class Catalog:
+    STATE = ("site_up", "up_since")
+
+    def __init__(self, placement, data_manager_list):
+        """
+        global directory of where each variable lives and which sites are up
+        placement (Placement)
+        data_manager_list (list of DataManager): site i is data_manager_list[i - 1]
+        replicas (dict -- var_id (str) : list of DataManager): sites holding var_id, ascending, filled on first lookup
+        site_up (list of bool): site_up[i] is the status of site i
+        up_since (list of int): up_since[i] is when site i last went up, None while it is down
+        """
+        self.placement = placement
+        self.data_manager_list = data_manager_list
+        self.replicas = {}
+        self.site_up = [True] * (len(data_manager_list) + 1)
+        self.up_since = [0] * (len(data_manager_list) + 1)
+
+
+    def replicas_of(self, var_id):
+        """
+        Return (list of DataManager): all sites holding var_id
+        """
+        res = self.replicas.get(var_id)
+        if res is None:
+            i = self.placement.var_number(var_id)
+            sites = self.placement.sites_of(i) if i is not None else []
+            res = [self.data_manager_list[site_id - 1] for site_id in sites]
+            self.replicas[var_id] = res
+        return res
+
+
+    def up_replicas_of(self, var_id):
+        """
+        Return (list of DataManager): working sites holding var_id
+        """
+        return [dm for dm in self.replicas_of(var_id) if self.site_up[dm.site_id]]
+
+
+    def peer_version(self, site_id, var_id):
+        """
+        the latest committed version of var_id at another working site, for the copy at site_id to catch up
+        Return (int, int): the value and its commit time, None if no working copy can tell or a transaction
+            is writing var_id, as it would commit at the copies it locked only
+        """
+        latest = None
+        for dm in self.up_replicas_of(var_id):
+            if dm.site_id != site_id:
+                if dm.is_being_written(var_id):
+                    return None
+                version = dm.committed(var_id)
+                if version is not None and (latest is None or version[1] > latest[1]):
+                    latest = version
+        return latest
+
+
+    def set_site_status(self, site_id, up, timestamp=0):
+        """
+        site_id (int)
+        up (bool)
+        timestamp (int): when the site goes up or down
+        """
+        self.site_up[site_id] = up
+        self.up_since[site_id] = timestamp if up else None
+
+
+    def snapshot(self, timestamp):
+        """
+        Return (Snapshot): what a read-only transaction beginning at timestamp may read
+        """
+        return Snapshot(timestamp, tuple(self.up_since))
+
+
+class Snapshot:
+    __slots__ = ("timestamp", "up_since", "cache")
+
+    def __init__(self, timestamp, up_since):
+        """
+        a read-only transaction reads a replicated copy only if its site stayed up from the commit of the
+        version it reads until the transaction began
+        timestamp (int): when the transaction began
+        up_since (tuple of int): up_since[i] is since when site i was up at timestamp, None if it was down
+        cache (dict -- var_id : (site_id, value)): variables read so far, a snapshot does not change
+        """
+        self.timestamp = timestamp
+        self.up_since = up_since
+        self.cache = {}
@@ -0,0 +1,162 @@
+import mmap
+import os
+import struct
+
+MAGIC = b"RCCK"
+# magic, format version, site flags, last commit timestamp, number of records, number of history entries
+HEADER = struct.Struct("<4sHHqQQ")
+# var number, latest value, its commit timestamp, flags, first history entry, number of history entries
+RECORD = struct.Struct("<QqqBxxxII")
+# commit timestamp, value of an older version
+HISTORY = struct.Struct("<qq")
+# length of a value kept in the overflow section after the history, followed by its bytes
+OVERFLOW = struct.Struct("<I")
+
+REPLICATED = 1
+AVAILABLE = 2
+# the values of the record and of its history are offsets in the overflow section
+BIG_VALUES = 4
+SITE_HAS_FAILED = 1
+
+
+class CheckpointRecord:
+    __slots__ = ("var_number", "value", "timestamp", "replicated", "available", "history")
+
+    def __init__(self, var_number, value, timestamp, replicated, available, history):
+        """
+        var_number (int)
+        value (int): latest committed value
+        timestamp (int): when value was committed
+        replicated (bool)
+        available (bool)
+        history (list of (timestamp, value)): older versions, oldest first
+        """
+        self.var_number = var_number
+        self.value = value
+        self.timestamp = timestamp
+        self.replicated = replicated
+        self.available = available
+        self.history = history
+
+
+    def versions(self):
+        """
+        Return (list of (timestamp, value)): all versions, oldest first
+        """
+        return self.history + [(self.timestamp, self.value)]
+
+
+def fits(value):
+    return -2 ** 63 <= value < 2 ** 63
+
+
+def add_overflow(overflow, value):
+    """
+    append value to the overflow section
+    overflow (bytearray)
+    Return (int): its offset in the section
+    """
+    offset = len(overflow)
+    data = value.to_bytes(value.bit_length() // 8 + 1, "little", signed=True)
+    overflow += OVERFLOW.pack(len(data))
+    overflow += data
+    return offset
+
+
+def write_checkpoint(path, has_failed, timestamp, records):
+    """
+    write a checkpoint file atomically
+    path (str)
+    has_failed (bool): the site failed before, copies not in the file may be unavailable
+    timestamp (int): last commit the checkpoint covers
+    records (iterable of CheckpointRecord): sorted by var_number, the values of a record with a value
+        that does not fit in 64 bits all go to the overflow section
+    """
+    tmp_path = path + ".tmp"
+    packed, history, overflow = [], [], bytearray()
+    for rec in records:
+        flags = (REPLICATED if rec.replicated else 0) | (AVAILABLE if rec.available else 0)
+        value, versions = rec.value, rec.history
+        if not (fits(value) and all(fits(val) for _, val in versions)):
+            flags |= BIG_VALUES
+            value = add_overflow(overflow, value)
+            versions = [(ts, add_overflow(overflow, val)) for ts, val in versions]
+        packed.append(RECORD.pack(rec.var_number, value, rec.timestamp, flags, len(history), len(versions)))
+        history.extend(HISTORY.pack(ts, val) for ts, val in versions)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 1, SITE_HAS_FAILED if has_failed else 0, timestamp, len(packed), len(history)))
+        f.write(b"".join(packed))
+        f.write(b"".join(history))
+        f.write(overflow)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CheckpointFile:
+    def __init__(self, path):
+        """
+        a checkpoint mapped in memory, records are decoded only when looked up
+        path (str)
+        """
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, site_flags, self.timestamp, self.count, history_count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a checkpoint".format(path))
+        self.has_failed = bool(site_flags & SITE_HAS_FAILED)
+        self.history_start = HEADER.size + self.count * RECORD.size
+        self.overflow_start = self.history_start + history_count * HISTORY.size
+
+
+    def __len__(self):
+        return self.count
+
+
+    def record_at(self, idx):
+        var_number, value, timestamp, flags, first, n = RECORD.unpack_from(self.map, HEADER.size + idx * RECORD.size)
+        history = [HISTORY.unpack_from(self.map, self.history_start + (first + k) * HISTORY.size) for k in range(n)]
+        if flags & BIG_VALUES:
+            value = self.overflow_at(value)
+            history = [(ts, self.overflow_at(val)) for ts, val in history]
+        return CheckpointRecord(var_number, value, timestamp, bool(flags & REPLICATED), bool(flags & AVAILABLE), history)
+
+
+    def overflow_at(self, offset):
+        """
+        Return (int): the value at offset in the overflow section
+        """
+        start = self.overflow_start + offset
+        length, = OVERFLOW.unpack_from(self.map, start)
+        return int.from_bytes(self.map[start + OVERFLOW.size:start + OVERFLOW.size + length], "little", signed=True)
+
+
+    def var_number_at(self, idx):
+        return RECORD.unpack_from(self.map, HEADER.size + idx * RECORD.size)[0]
+
+
+    def find(self, var_number):
+        """
+        binary search the fixed size records
+        Return (CheckpointRecord): None if the variable is not in the checkpoint
+        """
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.var_number_at(mid) < var_number:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.var_number_at(lo) == var_number:
+            return self.record_at(lo)
+        return None
+
+
+    def __iter__(self):
+        for idx in range(self.count):
+            yield self.record_at(idx)
+
+
+    def close(self):
+        self.map.close()
+        self.file.close()
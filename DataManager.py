@@ -1,7 +1,14 @@
+import sys
+from array import array
+from bisect import bisect_right
 from collections import defaultdict
-from ErrorHandler import InvalidInputError
+from Placement import DefaultPlacement
+from Checkpoint import CheckpointRecord
+from Output import TextSink
 
 class LockItem:
+    __slots__ = ("var_id", "lock_type", "trans_id")
+
     def __init__(self, var_id, lock_type, trans_id):
         """
         var_id (str)
@@ -13,17 +20,49 @@ class LockItem:
 
 
 class ReadLockItem(LockItem):
+    __slots__ = ("sharers",)
+
     def __init__(self, var_id, lock_type, trans_id):
+        """
+        sharers (set of trans_id): None while trans_id is the only holder
+        """
         super().__init__(var_id, lock_type, trans_id)
-        self.share_list = {trans_id}
+        self.sharers = None
+
+
+    @property
+    def share_list(self):
+        """
+        transactions holding the lock, do not modify it
+        """
+        return self.sharers if self.sharers is not None else (self.trans_id,)
+
+
+    def add_sharer(self, trans_id):
+        if self.sharers is None:
+            if trans_id == self.trans_id:
+                return
+            self.sharers = {self.trans_id}
+        self.sharers.add(trans_id)
+
+
+    def remove_sharer(self, trans_id):
+        if self.sharers is None:
+            self.sharers = set()
+        else:
+            self.sharers.remove(trans_id)
 
 
 class WriteLockItem(LockItem):
+    __slots__ = ()
+
     def __init__(self, var_id, lock_type, trans_id):
         super().__init__(var_id, lock_type, trans_id)
 
 
 class LockManager:
+    __slots__ = ("current_lock", "lock_queue")
+
     def __init__(self):
         """
         current_lock (LockItem)
@@ -56,7 +95,7 @@ class LockManager:
         add trans_id into the share list
         trans_id (str)
         """
-        self.current_lock.share_list.add(trans_id)
+        self.current_lock.add_sharer(trans_id)
 
 
     def add_lock_to_queue(self, lock: LockItem):
@@ -85,7 +124,7 @@ class LockManager:
         """
         if self.current_lock:
             if self.current_lock.lock_type == "R" and trans_id in self.current_lock.share_list:
-                self.current_lock.share_list.remove(trans_id)
+                self.current_lock.remove_sharer(trans_id)
                 if not len(self.current_lock.share_list):
                     self.current_lock = None
             elif self.current_lock.lock_type == "W" and trans_id == self.current_lock.trans_id:
@@ -108,75 +147,400 @@ class LockManager:
                     break
                 self.share_lock(lk.trans_id)
                 self.lock_queue.remove(lk)
-                
 
-class CommitValue:
-    def __init__(self, value, timestamp):
+
+    def wait_for_edges(self):
         """
-        value (int)
-        timestamp (int)        
+        edges of the wait-for graph caused by this lock
+        Return (set of (waiter trans_id, holder trans_id))
+        """
+        edges = set()
+        cur_lock = self.current_lock
+        if not cur_lock or not self.lock_queue:
+            return edges
+        for lock_in_queue in self.lock_queue:
+            if cur_lock.lock_type == "R":
+                # a sharer upgrading to a write lock waits for the other sharers
+                for trans_id in cur_lock.share_list:
+                    if trans_id != lock_in_queue.trans_id:
+                        edges.add((lock_in_queue.trans_id, trans_id))
+            elif cur_lock.trans_id != lock_in_queue.trans_id:
+                edges.add((lock_in_queue.trans_id, cur_lock.trans_id))
+
+        for i in range(len(self.lock_queue)):
+            lock_i = self.lock_queue[i]
+            for j in range(i):
+                lock_j = self.lock_queue[j]
+                if lock_j.lock_type == "R" and lock_i.lock_type == "R":
+                    continue
+                if lock_j.trans_id != lock_i.trans_id:
+                    edges.add((lock_i.trans_id, lock_j.trans_id))
+        return edges
+
+
+class VersionChain:
+    __slots__ = ("timestamps", "values")
+
+    def __init__(self, value):
+        """
+        committed versions of a variable, oldest first
+        timestamps (array of int): commit time of each version, ascending
+        values (array of int): value of each version, a list once a value does not fit in 64 bits
+        """
+        self.timestamps = array("q", [0])
+        try:
+            self.values = array("q", [value])
+        except OverflowError:
+            self.values = [value]
+
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+    def latest(self):
+        """
+        Return (int): the last committed value
+        """
+        return self.values[-1]
+
+
+    def append(self, value, timestamp, max_versions=None):
+        """
+        add a version committed at timestamp, which is not older than the others
+        max_versions (int): keep at most this many versions, None for no limit
+        """
+        try:
+            self.values.append(value)
+        except OverflowError:
+            self.values = list(self.values)
+            self.values.append(value)
+        self.timestamps.append(timestamp)
+        if max_versions and len(self.timestamps) > max_versions:
+            del self.timestamps[:-max_versions]
+            del self.values[:-max_versions]
+
+
+    def prune(self, watermark):
+        """
+        discard the versions no snapshot at or after watermark can see
+        Return (int, int): number of versions and bytes reclaimed
+        """
+        idx = bisect_right(self.timestamps, watermark) - 1
+        if idx <= 0:
+            return 0, 0
+        value_size = self.values.itemsize if isinstance(self.values, array) else 8 + sys.getsizeof(self.values[0])
+        del self.timestamps[:idx]
+        del self.values[:idx]
+        return idx, idx * (self.timestamps.itemsize + value_size)
+
+
+    def restore(self, versions):
+        """
+        replace the chain by versions read back from disk
+        versions (list of (timestamp, value)): oldest first
         """
-        self.value = value
-        self.timestamp = timestamp
+        self.timestamps = array("q", [ts for ts, _ in versions])
+        try:
+            self.values = array("q", [val for _, val in versions])
+        except OverflowError:
+            self.values = [val for _, val in versions]
+
+
+    def version_at(self, timestamp):
+        """
+        the latest version committed no later than timestamp
+        Return: bool, int, int -- False if that version has been discarded, its value and commit time
+        """
+        idx = bisect_right(self.timestamps, timestamp) - 1
+        if idx < 0:
+            return False, None, None
+        return True, self.values[idx], self.timestamps[idx]
+
+
+    def read_at(self, timestamp):
+        """
+        value of the latest version committed no later than timestamp
+        Return: bool, int -- False if that version has been discarded
+        """
+        idx = bisect_right(self.timestamps, timestamp) - 1
+        if idx < 0:
+            return False, None
+        return True, self.values[idx]
 
 
 class Variable:
+    __slots__ = ("var_id", "versions", "replicated", "available")
+
     def __init__(self, var_id, value, replicated):
         """
         var_id (str)
         value (int)
-        commit_val (CommitValue)
-        temp_val (int)
+        versions (VersionChain)
         replicated (bool)
         available (bool): a var is unavailable after recover from failure until a write commited
         """
         self.var_id = var_id
-        self.commit_val = [CommitValue(value, 0)]
-        self.temp_val = value
+        self.versions = VersionChain(value)
         self.replicated = replicated
-        self.lock_manager = LockManager()
         self.available = True
 
 
+def pack_variables(variable_table):
+    """
+    the variables in columns, pickling many small objects is what makes a snapshot slow
+    Return (tuple): var_ids, replicated and available flags, number of versions, then the timestamps and
+        the values of all versions one variable after the other
+    """
+    var_ids, flags, lengths, timestamps, values = [], bytearray(), array("q"), array("q"), []
+    for var in variable_table.values():
+        chain = var.versions
+        var_ids.append(var.var_id)
+        flags.append(var.replicated | var.available << 1)
+        lengths.append(len(chain))
+        timestamps.extend(chain.timestamps)
+        values.extend(chain.values)
+    return var_ids, bytes(flags), lengths, timestamps, values
+
+
+def unpack_variables(packed):
+    """
+    Return (dict -- var_id : Variable): the variable table pack_variables was given
+    """
+    var_ids, flags, lengths, timestamps, values = packed
+    variable_table = {}
+    start = 0
+    for var_id, flag, length in zip(var_ids, flags, lengths):
+        var = Variable.__new__(Variable)
+        var.var_id = var_id
+        var.replicated = bool(flag & 1)
+        var.available = bool(flag & 2)
+        chain = var.versions = VersionChain.__new__(VersionChain)
+        chain.timestamps = timestamps[start:start + length]
+        try:
+            chain.values = array("q", values[start:start + length])
+        except OverflowError:
+            chain.values = values[start:start + length]
+        variable_table[var_id] = var
+        start += length
+    return variable_table
+
+
 class DataManager:
-    def __init__(self, site_id):
+    STATE = ("is_working", "visited_transaction", "lock_table", "transaction_locks", "write_sets", "has_failed",
+             "multiversion_vars", "clock")
+
+    def __init__(self, site_id, placement=None, max_versions=None, wal=None, output=None):
         """
         site_id (int)
-        variable_table (dict -- x1 (str) : Variable(x1))
+        placement (Placement): which variables this site holds
+        max_versions (int): committed versions kept per variable, None for no limit
+        wal (WriteAheadLog): makes committed writes durable, the site then loses its memory when it fails,
+            its checkpoint and log are loaded if the log was opened to restore a previous run
+        output (Sink): where dump goes, text on standard output by default
+        variable_table (dict -- x1 (str) : Variable(x1)): variables built lazily on first access
         visited_transaction (set of trans_id): transactions who visited this site 
+        lock_listeners (list of callable(site_id, var_id, LockManager)): notified whenever a lock may change
+        transaction_locks (dict -- trans_id : set of var_id): variables a transaction holds or waits for a lock on
+        write_sets (dict -- trans_id : dict -- var_id : value): values a transaction wrote here and did not commit yet
+        has_failed (bool): the site failed before, so replicated copies not yet built are unavailable
+        multiversion_vars (set of var_id): variables with more than one committed version
+        checkpoint (CheckpointFile): committed variables on disk, built into variable_table on first access
+        failed_since_checkpoint (bool): replicated copies read from the checkpoint are unavailable
+        clock (int): timestamp of the last commit the site applied
+        lock_table (dict -- var_id : LockManager): locks of the variables held or waited for, an entry is made
+            on the first request and dropped once nobody holds or waits for the lock
+        held_notifications (list of var_id): lock changes kept from the listeners while a SitePool runs the site
+        lock_policy (callable(trans_id, LockManager) -> bool): asked before a conflicting request is queued, a
+            False answer leaves the request out as its transaction is aborted, None to always queue
+        catch_up_source (callable(site_id, var_id) -> (value, timestamp)): latest committed version of a
+            variable at an up-to-date peer, None if there is none; None to leave an unavailable replicated
+            copy unavailable until a write commits here
         """
         self.site_id = site_id
+        self.placement = placement if placement else DefaultPlacement()
+        self.output = output if output else TextSink()
         self.variable_table = {}
         self.is_working = True
         self.visited_transaction = set()
+        self.lock_listeners = []
+        self.lock_table = {}
+        self.held_notifications = None
+        self.lock_policy = None
+        self.catch_up_source = None
+        self.transaction_locks = defaultdict(set)
+        self.write_sets = {}
+        self.has_failed = False
+        self.max_versions = max_versions
+        self.multiversion_vars = set()
+        self.wal = wal
+        self.checkpoint = None
+        self.failed_since_checkpoint = False
+        self.clock = 0
+        if wal:
+            self.checkpoint = wal.open_checkpoint()
+            if self.checkpoint:
+                self.has_failed = self.checkpoint.has_failed
+                self.clock = self.checkpoint.timestamp
+            self.replay_log()
+
+
+    def new_variable(self, var_id):
+        """
+        build var_id from the checkpoint, or with its initial value
+        """
+        i = self.placement.var_number(var_id)
+        rec = self.checkpoint.find(i) if self.checkpoint else None
+        if rec:
+            var = Variable(var_id, rec.value, rec.replicated)
+            var.versions.restore(rec.versions())
+            var.available = rec.available and not (rec.replicated and self.failed_since_checkpoint)
+            if len(var.versions) > 1:
+                self.multiversion_vars.add(var_id)
+            return var
+        var = Variable(var_id, self.placement.initial_value(i), self.placement.is_replicated(i, self.site_id))
+        if var.replicated and self.has_failed:
+            var.available = False
+        return var
+
+
+    def get_variable(self, var_id):
+        """
+        get a variable of this site, building it on first access
+        Return (Variable): None if the variable is not here
+        """
+        var = self.variable_table.get(var_id)
+        if var is None and self.placement.hosts(self.site_id, var_id):
+            var = self.new_variable(var_id)
+            self.variable_table[var_id] = var
+        return var
+
+
+    def replay_log(self):
+        """
+        redo the commits logged after the checkpoint
+        """
+        for timestamp, var_id, value in self.wal.read_log():
+            var: Variable = self.get_variable(var_id)
+            var.versions.append(value, timestamp, self.max_versions)
+            var.available = True
+            if len(var.versions) > 1:
+                self.multiversion_vars.add(var_id)
+            self.clock = max(self.clock, timestamp)
+
+
+    def write_checkpoint(self):
+        """
+        checkpoint the committed variables, those of the previous checkpoint not built yet included
+        """
+        records = {}
+        if self.checkpoint:
+            for rec in self.checkpoint:
+                rec.available = rec.available and not (rec.replicated and self.failed_since_checkpoint)
+                records[rec.var_number] = rec
+        for var_id, var in self.variable_table.items():
+            chain = var.versions
+            if len(chain) == 1 and chain.timestamps[0] == 0:
+                continue
+            history = list(zip(chain.timestamps[:-1], chain.values[:-1]))
+            records[self.placement.var_number(var_id)] = CheckpointRecord(
+                self.placement.var_number(var_id), chain.latest(), chain.timestamps[-1],
+                var.replicated, var.available, history)
+        self.wal.checkpoint(self.has_failed, self.clock, (records[i] for i in sorted(records)))
+        if self.checkpoint:
+            self.checkpoint.close()
+        self.checkpoint = self.wal.open_checkpoint()
+        self.failed_since_checkpoint = False
+
+
+    def durable_value(self, i, logged):
+        """
+        latest value of variable i on disk
+        logged (dict -- var_id : value): latest values in the log
+        """
+        var_id = "x" + str(i)
+        if var_id in logged:
+            return logged[var_id]
+        rec = self.checkpoint.find(i) if self.checkpoint else None
+        return rec.value if rec else self.placement.initial_value(i)
+
 
-        for i in range(1, 21):
-            var_idx = "x" + str(i)
-            if i % 2 == 0:
-                self.variable_table[var_idx] = Variable(var_idx, 10 * i, True)
-            if i % 10 + 1 == site_id:
-                self.variable_table[var_idx] = Variable(var_idx, 10 * i, False)
+    def hosts(self, var_id):
+        """
+        whether this site holds a copy of var_id
+        """
+        return self.placement.hosts(self.site_id, var_id)
 
 
-    def read_snapshot(self, timestamp: int, var_id):
+    def lock_of(self, var_id):
+        """
+        Return (LockManager): the lock of var_id, made if nobody holds or waits for it
+        """
+        lm = self.lock_table.get(var_id)
+        if lm is None:
+            lm = self.lock_table[var_id] = LockManager()
+        return lm
+
+
+    def notify_lock_change(self, var_id):
+        """
+        tell the listeners that the lock of var_id may have changed, then drop it if it is idle
+        var_id (str)
+        """
+        if self.held_notifications is not None:
+            self.held_notifications.append(var_id)
+            return
+        lm = self.lock_table.get(var_id)
+        if lm is None:
+            return
+        for listener in self.lock_listeners:
+            listener(self.site_id, var_id, lm)
+        if not lm.current_lock and not lm.lock_queue:
+            del self.lock_table[var_id]
+
+
+    def queue_lock(self, lm, lock):
+        """
+        queue a request that conflicts with the lock, unless the lock policy aborts its transaction
+        lm (LockManager)
+        lock (LockItem)
+        """
+        if self.lock_policy and not self.lock_policy(lock.trans_id, lm):
+            return
+        lm.add_lock_to_queue(lock)
+        self.notify_lock_change(lock.var_id)
+
+
+    def read_snapshot(self, timestamp: int, var_id, up_since=0):
         """
         read a value from snapshot, the read-only transaction began at "timestamp"
         timestamp (int)
         var_id (str)
-        Return: bool, int
+        up_since (int): since when the site was up at timestamp, None if it was down. A copy of a variable
+            with several copies may have missed writes while the site was down, so only versions committed
+            since can be read; 0 for a variable with a single copy, whose writes wait for its site
+        Return: bool, int -- False if the var is not here, the version has been discarded or cannot be trusted
         """
-        if not self.variable_table.get(var_id):
+        var: Variable = self.get_variable(var_id)
+        if not var:
             return False, None
-        var: Variable = self.variable_table[var_id]
-        res = 0
-        for cval in var.commit_val:
-            if cval.timestamp <= timestamp:
-                res = cval.value
-            else:
-                break
-        return True, res
+        if up_since is None:
+            return False, None
+        if up_since:
+            res, val, committed = var.versions.version_at(timestamp)
+            return (True, val) if res and committed >= up_since else (False, None)
+        return var.versions.read_at(timestamp)
 
     
+    def has_discarded(self, timestamp, var_id):
+        """
+        whether the version of var_id a read-only transaction beginning at timestamp reads is gone from here,
+        a copy keeps only --max-versions versions
+        """
+        var: Variable = self.get_variable(var_id)
+        return var is not None and not var.versions.version_at(timestamp)[0]
+
+
     def read(self, trans_id, var_id):
         """
         read a value
@@ -184,37 +548,141 @@ class DataManager:
         var_id (str)
         Return: bool, int
         """
-        if not self.variable_table.get(var_id):
-            return False, None
-        var: Variable = self.variable_table[var_id]        
+        var: Variable = self.get_variable(var_id)
+        if not var:
+            return False, None        
         # if the var hasn't been visited after the site recovery
-        if not var.available:
+        if not self.available_copy(var):
             return False, None
 
-        if not var.lock_manager.current_lock:
-            var.lock_manager.change_current_lock(ReadLockItem(var_id, "R", trans_id))
-            return True, var.commit_val[-1].value
-        elif var.lock_manager.current_lock.lock_type == "R":
+        self.transaction_locks[trans_id].add(var_id)
+        lm: LockManager = self.lock_of(var_id)
+        if not lm.current_lock:
+            # nobody waits on a free lock, taking it wakes no operation and adds no wait-for edge
+            lm.change_current_lock(ReadLockItem(var_id, "R", trans_id))
+            return True, var.versions.latest()
+        elif lm.current_lock.lock_type == "R":
             # transaction has R lock
-            if trans_id in var.lock_manager.current_lock.share_list:
-                return True, var.commit_val[-1].value
+            if trans_id in lm.current_lock.share_list:
+                return True, var.versions.latest()
 
             # transaction does not have R lock
             # check write lock in lock queue 
-            if var.lock_manager.is_writelock_waiting():
-                var.lock_manager.add_lock_to_queue(ReadLockItem(var_id, "R", trans_id))
+            if lm.is_writelock_waiting():
+                self.queue_lock(lm, ReadLockItem(var_id, "R", trans_id))
                 return False, None
             else:
-                var.lock_manager.share_lock(trans_id)
-                return True, var.commit_val[-1].value
-        elif var.lock_manager.current_lock.trans_id == trans_id:
-            return True, var.temp_val
+                lm.share_lock(trans_id)
+                if lm.lock_queue:
+                    self.notify_lock_change(var_id)
+                return True, var.versions.latest()
+        elif lm.current_lock.trans_id == trans_id:
+            return True, self.write_sets.get(trans_id, {}).get(var_id, var.versions.latest())
         
         # is being written by other transaction, add to queue
-        var.lock_manager.add_lock_to_queue(ReadLockItem(var_id, "R", trans_id))
+        self.queue_lock(lm, ReadLockItem(var_id, "R", trans_id))
         return False, None
 
 
+    def read_many(self, trans_id, var_ids):
+        """
+        read several variables of this site in one call, their locks are requested in the order of var_ids
+        Return (list of (var_id, value)): the variables read, the others wait for a lock or cannot be read here
+        """
+        res = []
+        for var_id in var_ids:
+            ok, val = self.read(trans_id, var_id)
+            if ok:
+                res.append((var_id, val))
+        return res
+
+
+    def read_latest(self, var_id):
+        """
+        read the last committed value without taking a lock, for optimistic transactions
+        var_id (str)
+        Return: bool, int, int -- False if the var is not here or not available, the value and its commit time
+        """
+        var: Variable = self.get_variable(var_id)
+        if not var or not self.available_copy(var):
+            return False, None, None
+        return True, var.versions.latest(), var.versions.timestamps[-1]
+
+
+    def committed(self, var_id):
+        """
+        the latest committed version, for a recovered peer to catch up with
+        var_id (str)
+        Return (int, int): the value and its commit time, None if the var is not here or not available
+        """
+        var: Variable = self.get_variable(var_id)
+        if not var or not var.available:
+            return None
+        return var.versions.latest(), var.versions.timestamps[-1]
+
+
+    def is_being_written(self, var_id):
+        """
+        Return (bool): whether a transaction holds the write lock of var_id here
+        """
+        lm = self.lock_table.get(var_id)
+        return bool(lm and lm.current_lock and lm.current_lock.lock_type == "W")
+
+
+    def available_copy(self, var):
+        """
+        whether a copy can be read, an unavailable replicated copy first tries to catch up with a peer
+        var (Variable)
+        Return (bool)
+        """
+        if var.available:
+            return True
+        if not self.catch_up_source:
+            return False
+        version = self.catch_up_source(self.site_id, var.var_id)
+        if version is None:
+            return False
+        self.catch_up(var, *version)
+        return True
+
+
+    def catch_up(self, var, value, timestamp):
+        """
+        make a replicated copy available again with the latest committed version of a peer
+        var (Variable)
+        value (int)
+        timestamp (int): when the version was committed
+        """
+        if timestamp > var.versions.timestamps[-1]:
+            if self.wal:
+                self.wal.log_commit(timestamp, [(var.var_id, value)])
+            var.versions.append(value, timestamp, self.max_versions)
+            self.multiversion_vars.add(var.var_id)
+            self.clock = max(self.clock, timestamp)
+        var.available = True
+
+
+    def catch_up_all(self):
+        """
+        bring every unavailable replicated copy up to date at once, those a transaction is writing at
+        other sites stay unavailable
+        """
+        for var_id in self.unavailable_copies():
+            self.available_copy(self.variable_table[var_id])
+
+
+    def unavailable_copies(self):
+        """
+        Return (list of var_id): replicated copies that cannot be read until they are written or caught up
+        """
+        res = []
+        for i in self.placement.variables_at(self.site_id):
+            var: Variable = self.get_variable("x" + str(i))
+            if var.replicated and not var.available:
+                res.append(var.var_id)
+        return res
+
+
     def check_write(self, trans_id, var_id):
         """
         check whether a transaction can write
@@ -222,27 +690,42 @@ class DataManager:
         True: can write here OR var_id is not here
         False: is here but cannot write
         """
-        if not self.variable_table.get(var_id):
+        var: Variable = self.get_variable(var_id)
+        if not var:
             return True
-        var: Variable = self.variable_table[var_id]
-        if not var.lock_manager.current_lock:
-            var.lock_manager.change_current_lock(WriteLockItem(var_id, "W", trans_id))
+        self.transaction_locks[trans_id].add(var_id)
+        lm: LockManager = self.lock_of(var_id)
+        if not lm.current_lock:
+            lm.change_current_lock(WriteLockItem(var_id, "W", trans_id))
             return True
-        elif var.lock_manager.current_lock.lock_type == "R":
-            if len(var.lock_manager.current_lock.share_list) != 1 \
-                    or trans_id not in var.lock_manager.current_lock.share_list \
-                    or var.lock_manager.is_writelock_waiting(trans_id):
-                var.lock_manager.add_lock_to_queue(WriteLockItem(var_id, "W", trans_id))
+        elif lm.current_lock.lock_type == "R":
+            if len(lm.current_lock.share_list) != 1 \
+                    or trans_id not in lm.current_lock.share_list \
+                    or lm.is_writelock_waiting(trans_id):
+                self.queue_lock(lm, WriteLockItem(var_id, "W", trans_id))
                 return False
-            var.lock_manager.promote_current_lock(WriteLockItem(var_id, "W", trans_id))
+            lm.promote_current_lock(WriteLockItem(var_id, "W", trans_id))
+            self.notify_lock_change(var_id)
             return True
         else:
-            if var.lock_manager.current_lock.trans_id == trans_id:
+            if lm.current_lock.trans_id == trans_id:
                 return True
-            var.lock_manager.add_lock_to_queue(WriteLockItem(var_id, "W", trans_id))
+            self.queue_lock(lm, WriteLockItem(var_id, "W", trans_id))
             return False
 
     
+    def check_write_many(self, trans_id, var_ids):
+        """
+        request the write locks of several variables of this site in one call, in the order of var_ids
+        Return (bool): whether every lock is granted, the others are queued
+        """
+        granted = True
+        for var_id in var_ids:
+            if not self.check_write(trans_id, var_id):
+                granted = False
+        return granted
+
+
     def write(self, trans_id, var_id, value):
         """
         write a value
@@ -251,9 +734,10 @@ class DataManager:
         value (int)
         Return (bool): write successful
         """
-        if not self.variable_table.get(var_id):
+        var: Variable = self.get_variable(var_id)
+        if not var:
             return False
-        self.variable_table[var_id].temp_val = value
+        self.write_sets.setdefault(trans_id, {})[var_id] = value
         # record the trans_id in case the site fails and the trans_id need to be aborted
         self.visited_transaction.add(trans_id)
         return True
@@ -264,45 +748,113 @@ class DataManager:
         gives the commited values of all copies of all variables at all sites
         sorted per site with all values in ascending order by variable name
         """
-        updown = "UP" if self.is_working else "DOWN"
-        res = "[{}]Site {} ".format(updown, self.site_id)
-        for var in self.variable_table.values():
-            res += "-- {}: {} ".format(var.var_id, var.commit_val[-1].value)
-        print(res)
+        self.output.dump_site(self.site_id, self.is_working, self.dump_values())
+
+
+    def dump_values(self):
+        """
+        Return (list of (var_id, value)): the committed value of each variable of the site, ascending
+        """
+        if not self.is_working and self.wal:
+            # a failed site with a log has nothing in memory, show what is on disk
+            logged = {var_id: value for _, var_id, value in self.wal.read_log()}
+            return [("x" + str(i), self.durable_value(i, logged)) for i in self.placement.variables_at(self.site_id)]
+        values = []
+        for i in self.placement.variables_at(self.site_id):
+            var_id = "x" + str(i)
+            var = self.get_variable(var_id) if self.checkpoint else self.variable_table.get(var_id)
+            values.append((var_id, var.versions.latest() if var else self.placement.initial_value(i)))
+        return values
 
 
     def abort(self, trans_id):
         """
-        abort a transaction
+        abort a transaction, what it wrote here is dropped
         """
-        for var in self.variable_table.values():
-            lm: LockManager = var.lock_manager
+        self.write_sets.pop(trans_id, None)
+        for var_id in self.transaction_locks.pop(trans_id, ()):
+            lm: LockManager = self.lock_table.get(var_id)
+            if lm is None:
+                continue
             lm.release_current_lock(trans_id)
             for lk in list(lm.lock_queue):
                 if lk.trans_id == trans_id:
                     lm.lock_queue.remove(lk)
             lm.update_lock_queue()
+            self.notify_lock_change(var_id)
+
+
+    def waits_for_lock(self, trans_id, var_id):
+        """
+        whether a lock request of trans_id on var_id is queued here
+        """
+        lm = self.lock_table.get(var_id)
+        return lm is not None and any(lk.trans_id == trans_id for lk in lm.lock_queue)
 
 
     def commit(self, trans_id, timestamp):
         """
         commit a transaction
         """
-        for var in self.variable_table.values():
-            lm: LockManager = var.lock_manager
-            if lm.current_lock and lm.current_lock.lock_type == "W" and lm.current_lock.trans_id == trans_id:
-                var.commit_val.append(CommitValue(var.temp_val, timestamp))
+        locked = self.transaction_locks.pop(trans_id, ())
+        writes = self.write_sets.pop(trans_id, None)
+        self.clock = timestamp
+        if writes:
+            if self.wal:
+                self.wal.log_commit(timestamp, list(writes.items()))
+            for var_id, value in writes.items():
+                var: Variable = self.variable_table[var_id]
+                var.versions.append(value, timestamp, self.max_versions)
+                self.multiversion_vars.add(var_id)
                 var.available = True
+        for var_id in locked:
+            lm: LockManager = self.lock_table.get(var_id)
+            if lm is None:
+                continue
             lm.release_current_lock(trans_id)
-            
+            # a read served by another site leaves its request queued here
             for lk in list(lm.lock_queue):
                 if lk.trans_id == trans_id:
-                    # print(self.site_id)
-                    # print(var.var_id)
-                    raise InvalidInputError("ERROR: transaction {} commits before all operations done".format(trans_id))
-            
+                    lm.lock_queue.remove(lk)
             lm.update_lock_queue()
-            
+            self.notify_lock_change(var_id)
+        if self.wal and self.wal.should_checkpoint():
+            self.write_checkpoint()
+
+
+    def install(self, timestamp, writes):
+        """
+        commit the writes of an optimistic transaction, which holds no lock here
+        timestamp (int)
+        writes (list of (var_id, value))
+        """
+        self.clock = timestamp
+        if self.wal:
+            self.wal.log_commit(timestamp, writes)
+        for var_id, value in writes:
+            var: Variable = self.get_variable(var_id)
+            var.versions.append(value, timestamp, self.max_versions)
+            self.multiversion_vars.add(var_id)
+            var.available = True
+        if self.wal and self.wal.should_checkpoint():
+            self.write_checkpoint()
+
+
+    def collect_versions(self, watermark):
+        """
+        prune the versions older than the one visible at watermark
+        watermark (int): timestamp of the oldest snapshot still readable
+        Return (int, int): number of versions and bytes reclaimed
+        """
+        versions, nbytes = 0, 0
+        for var_id in list(self.multiversion_vars):
+            chain: VersionChain = self.variable_table[var_id].versions
+            n, b = chain.prune(watermark)
+            versions += n
+            nbytes += b
+            if len(chain) == 1:
+                self.multiversion_vars.discard(var_id)
+        return versions, nbytes
 
 
     def fail(self):
@@ -310,63 +862,66 @@ class DataManager:
         fail a site, wipe out all the lock information of it
         """
         self.is_working = False
+        for var_id in list(self.lock_table):
+            lm: LockManager = self.lock_table[var_id]
+            lm.current_lock = None
+            lm.lock_queue = []
+            self.notify_lock_change(var_id)
+        self.transaction_locks.clear()
+        self.write_sets.clear()
+        self.has_failed = True
+        if self.wal:
+            # the site crashes, only what the checkpoint and the log made durable survives
+            self.variable_table = {}
+            self.multiversion_vars = set()
+            self.failed_since_checkpoint = True
+            return
         for var in self.variable_table.values():
-            var.lock_manager.current_lock = None
-            var.lock_manager.lock_queue = []
             if var.replicated:
                 var.available = False
 
 
     def recover(self):
         """
-        recover a site
+        recover a site, reloading its committed data from disk if it has a log
         """
         self.is_working = True
         self.visited_transaction = set()
+        if self.wal:
+            self.replay_log()
+            # the logged commits happened before the failure
+            for var in self.variable_table.values():
+                if var.replicated:
+                    var.available = False
 
 
-    def generate_graph(self):
-
-        def cur_blocks(cur_lock, lock_in_queue):
-            if cur_lock == "R":
-                if lock_in_queue.lock_type == "R" or \
-                    (len(cur_lock.share_list) == 1 and
-                    lock_in_queue.trans_id in cur_lock.share_list):
-                    return False
-                return True
-            return lm.current_lock.trans_id != lock_in_queue.trans_id
-        
-        def queue_blocks(lock_j,lock_i):
-            if lock_j.lock_type == "R" and lock_i.lock_type == "R":
-                 return False
-            return not lock_j.trans_id == lock_i.trans_id
-
-        graph = defaultdict(set)
-        for var_idx, var in self.variable_table.items():
-            lm = var.lock_manager
-            if not lm.current_lock or not lm.lock_queue:
-                continue
-            for lock_in_queue in lm.lock_queue:
-                cur_lock = lm.current_lock
-                if cur_blocks(cur_lock, lock_in_queue):
-                    if cur_lock.lock_type == "R":
-                        for trans_id in cur_lock.share_list:
-                            if trans_id != lock_in_queue.trans_id:
-                                graph[lock_in_queue.trans_id].add(trans_id)
-                    else:
-                        if cur_lock.trans_id == lock_in_queue:
-                            continue
-                        else:
-                            graph[lock_in_queue.trans_id].add(cur_lock.trans_id)
-        
-            for i in range(len(lm.lock_queue)):
-                lock_queue = lm.lock_queue
-                for j in range(i):
-                    if(queue_blocks(lock_queue[j],lock_queue[i])):
-                        graph[lock_queue[i].trans_id].add(lock_queue[j].trans_id)
-        return graph
+    def save_state(self):
+        """
+        Return (dict): what the site keeps in memory, for TransactionManager.save_state
+        """
+        state = {name: getattr(self, name) for name in self.STATE}
+        state["variable_table"] = pack_variables(self.variable_table)
+        return state
 
-            
 
+    def restore_state(self, state):
+        """
+        go back to a state of save_state
+        """
+        for name in self.STATE:
+            setattr(self, name, state[name])
+        self.variable_table = unpack_variables(state["variable_table"])
 
 
+    def close(self):
+        """
+        make the logged commits durable and checkpoint them before exiting
+        """
+        if self.wal:
+            if not self.is_working:
+                # a down site restarts as a recovered one
+                self.recover()
+            self.write_checkpoint()
+            self.wal.close()
+            if self.checkpoint:
+                self.checkpoint.close()
@@ -0,0 +1,155 @@
+from abc import ABC, abstractmethod
+from ErrorHandler import InvalidInputError
+
+
+def blockers(trans_id, lock_manager):
+    """
+    transactions a new request of trans_id would wait for: the holders of the lock and the requests queued before
+    Return (set of trans_id)
+    """
+    res = set()
+    lock = lock_manager.current_lock
+    if lock:
+        res.update(lock.share_list if lock.lock_type == "R" else (lock.trans_id,))
+    for lk in lock_manager.lock_queue:
+        res.add(lk.trans_id)
+    res.discard(trans_id)
+    return res
+
+
+class Detection:
+    """
+    let transactions wait, abort the youngest transaction of a cycle of the wait-for graph once one forms
+    """
+    prevents = False
+    STATE = ()
+
+    def __init__(self, tm):
+        self.tm = tm
+
+
+    def resolve(self):
+        """
+        called after the operations of a command ran
+        Return (bool): whether a transaction was aborted
+        """
+        if self.tm.deadlock_detect():
+            self.tm.execute()
+            return True
+        return False
+
+
+class Prevention(ABC):
+    """
+    decides when a lock request conflicts whether its transaction may wait, so that no cycle can form
+    victims (dict -- trans_id : reason): transactions to abort once the operations of the command ran
+    """
+    prevents = True
+    STATE = ("victims",)
+
+    def __init__(self, tm):
+        self.tm = tm
+        self.victims = {}
+
+
+    @abstractmethod
+    def may_wait(self, trans_id, lock_manager):
+        """
+        lock policy of DataManager, called before a conflicting request of trans_id is queued
+        Return (bool): False if trans_id is aborted instead
+        """
+
+
+    def resolve(self):
+        aborted = False
+        while self.victims:
+            victims, self.victims = self.victims, {}
+            for trans_id, reason in victims.items():
+                trans = self.tm.transaction_table.get(trans_id)
+                if trans:
+                    trans.abort_reason = reason
+                    self.tm.abort(trans_id)
+                    aborted = True
+            self.tm.execute()
+        return aborted
+
+
+    def timestamp(self, trans_id):
+        return self.tm.transaction_table[trans_id].timestamp
+
+
+class WaitDie(Prevention):
+    """
+    an older transaction waits for younger ones, a younger one is aborted instead of waiting for an older one
+    """
+    def may_wait(self, trans_id, lock_manager):
+        ts = self.timestamp(trans_id)
+        if all(ts < self.timestamp(other) for other in blockers(trans_id, lock_manager)):
+            return True
+        self.victims[trans_id] = "wait-die"
+        return False
+
+
+class WoundWait(Prevention):
+    """
+    an older transaction aborts the younger ones it would wait for, a younger one waits for older ones
+    """
+    def may_wait(self, trans_id, lock_manager):
+        ts = self.timestamp(trans_id)
+        # oldest victim first, whatever the order of the set
+        for other in sorted(blockers(trans_id, lock_manager), key=self.timestamp):
+            if ts < self.timestamp(other):
+                self.victims.setdefault(other, "wound-wait")
+        return True
+
+
+class NoWait(Prevention):
+    """
+    a transaction is aborted when it has waited for a lock more than timeout commands, at once with timeout 0
+    blocked_since (dict -- trans_id : timestamp): when a transaction with operations left first had to wait
+    """
+    STATE = ("victims", "blocked_since")
+
+    def __init__(self, tm, timeout=0):
+        super().__init__(tm)
+        self.timeout = timeout
+        self.blocked_since = {}
+
+
+    def may_wait(self, trans_id, lock_manager):
+        if not self.timeout:
+            self.victims[trans_id] = "no-wait"
+            return False
+        self.blocked_since.setdefault(trans_id, self.tm.timestamp)
+        return True
+
+
+    def resolve(self):
+        pending = self.tm.operation_queue.transaction_operations
+        for trans_id, since in list(self.blocked_since.items()):
+            if trans_id not in pending:
+                del self.blocked_since[trans_id]
+            elif self.tm.timestamp - since > self.timeout:
+                del self.blocked_since[trans_id]
+                self.victims[trans_id] = "lock timeout"
+        return super().resolve()
+
+
+POLICIES = {
+    "detect": Detection,
+    "wait-die": WaitDie,
+    "wound-wait": WoundWait,
+    "no-wait": NoWait,
+}
+
+
+def make_policy(name, tm, lock_timeout=0):
+    """
+    build a deadlock policy by its name in POLICIES
+    lock_timeout (int): for no-wait, commands a transaction may wait for a lock
+    """
+    if name not in POLICIES:
+        raise InvalidInputError("ERROR: unknown deadlock policy {}".format(name))
+    if name == "no-wait":
+        return NoWait(tm, lock_timeout)
+    return POLICIES[name](tm)
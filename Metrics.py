@@ -0,0 +1,233 @@
+import time
+from collections import defaultdict
+from Output import Sink
+
+# methods of TransactionManager whose calls are counted and timed
+TIMED = ("execute", "deadlock_detect", "read", "write", "read_many", "write_many", "commit", "abort")
+
+
+class Metrics(Sink):
+    def __init__(self, output, stats_interval=0):
+        """
+        counters and timers of a TransactionManager, it sits in front of its output to count events
+        output (Sink): where the events are forwarded
+        stats_interval (int): write a snapshot every stats_interval commands, 0 for never
+        timers (dict -- method name : [calls, seconds])
+        queue_depth (list of int): current, max and sum over commands of the pending operations
+        site_ops (dict -- site_id : [reads, writes])
+        aborts (dict -- reason (str) : int)
+        deadlock_victims (int)
+        lock_wait (dict -- var_id : [operations that waited, ticks waited])
+        arrival (dict -- seq : tick): when each pending operation arrived
+        degraded (dict -- site_id : [recoveries, ticks degraded, tick of the last recovery]): how long recovered
+            sites kept replicated copies they could not read
+        stale (dict -- site_id : list of var_id): copies a degraded site cannot read yet
+        """
+        self.output = output
+        self.stats_interval = stats_interval
+        self.timers = {}
+        self.commands = 0
+        self.queue_depth = [0, 0, 0]
+        self.site_ops = defaultdict(lambda: [0, 0])
+        self.aborts = defaultdict(int)
+        self.deadlock_victims = 0
+        self.lock_wait = defaultdict(lambda: [0, 0])
+        self.arrival = {}
+        self.degraded = {}
+        self.stale = {}
+
+
+    def instrument(self, tm):
+        """
+        replace the methods of tm by measured ones, a TransactionManager without Metrics pays nothing
+        tm (TransactionManager)
+        """
+        for name in TIMED:
+            setattr(tm, name, self.timed(name, getattr(tm, name)))
+        for name in ("read", "write", "read_many", "write_many"):
+            setattr(tm, name, self.waited(tm, getattr(tm, name)))
+        for name in ("commit", "abort"):
+            setattr(tm, name, self.forget(tm, getattr(tm, name)))
+        run_command = tm.run_command
+        queue = tm.operation_queue
+        append = queue.append
+
+        def measured_append(ope):
+            append(ope)
+            self.arrival[ope.seq] = tm.timestamp
+
+        def measured_run_command(command):
+            run_command(command)
+            depth = len(queue)
+            self.commands += 1
+            self.queue_depth[0] = depth
+            self.queue_depth[1] = max(self.queue_depth[1], depth)
+            self.queue_depth[2] += depth
+            if self.stale:
+                self.update_stale(tm)
+            if self.stats_interval and self.commands % self.stats_interval == 0:
+                self.output.stats(self.snapshot(tm))
+
+        queue.append = measured_append
+        tm.run_command = measured_run_command
+        tm.recover = tm.handlers["recover"] = self.recovered(tm, tm.recover)
+        tm.fail = tm.handlers["fail"] = self.failed(tm, tm.fail)
+
+
+    def timed(self, name, func):
+        timer = self.timers.setdefault(name, [0, 0.0])
+        clock = time.perf_counter
+
+        def measured(*args):
+            start = clock()
+            try:
+                return func(*args)
+            finally:
+                timer[0] += 1
+                timer[1] += clock() - start
+        return measured
+
+
+    def waited(self, tm, func):
+        """
+        charge the ticks an operation waited to its variable once it runs
+        """
+        def measured(ope):
+            res = func(ope)
+            if res:
+                arrival = self.arrival.pop(ope.seq, tm.timestamp)
+                if arrival < tm.timestamp:
+                    for var_id in ope.variables():
+                        wait = self.lock_wait[var_id]
+                        wait[0] += 1
+                        wait[1] += tm.timestamp - arrival
+            return res
+        return measured
+
+
+    def forget(self, tm, func):
+        """
+        drop the arrival of the operations a finishing transaction leaves behind
+        """
+        def measured(trans_id):
+            for seq in tm.operation_queue.transaction_operations.get(trans_id, ()):
+                self.arrival.pop(seq, None)
+            return func(trans_id)
+        return measured
+
+
+    def recovered(self, tm, func):
+        """
+        a recovered site stays degraded until all its replicated copies can be read
+        """
+        def measured(site_id):
+            func(site_id)
+            degraded = self.degraded.setdefault(site_id, [0, 0, 0])
+            degraded[0] += 1
+            degraded[2] = tm.timestamp
+            self.stale[site_id] = tm.data_manager_list[site_id - 1].unavailable_copies()
+            self.update_stale(tm)
+        return measured
+
+
+    def failed(self, tm, func):
+        """
+        a site failing while degraded stops being degraded, it is down
+        """
+        def measured(site_id):
+            func(site_id)
+            if site_id in self.stale:
+                del self.stale[site_id]
+                self.degraded[site_id][1] += tm.timestamp - self.degraded[site_id][2]
+        return measured
+
+
+    def update_stale(self, tm):
+        """
+        drop the copies that became readable, a site with none left is not degraded any more
+        """
+        for site_id in list(self.stale):
+            dm = tm.data_manager_list[site_id - 1]
+            stale = [var_id for var_id in self.stale[site_id] if not dm.get_variable(var_id).available]
+            if stale:
+                self.stale[site_id] = stale
+            else:
+                del self.stale[site_id]
+                self.degraded[site_id][1] += tm.timestamp - self.degraded[site_id][2]
+
+
+    def snapshot(self, tm):
+        """
+        Return (dict): the current values of the counters, the 10 variables waited on the longest
+        """
+        longest = sorted(self.lock_wait.items(), key=lambda item: -item[1][1])[:10]
+        return {
+            "timestamp": tm.timestamp,
+            "timers": {name: {"calls": calls, "ms": round(seconds * 1000, 3)}
+                       for name, (calls, seconds) in self.timers.items()},
+            "queue_depth": {"current": self.queue_depth[0], "max": self.queue_depth[1],
+                            "mean": round(self.queue_depth[2] / self.commands, 2) if self.commands else 0},
+            "aborts": dict(self.aborts),
+            "deadlock_victims": self.deadlock_victims,
+            "site_ops": {site_id: {"reads": reads, "writes": writes}
+                         for site_id, (reads, writes) in sorted(self.site_ops.items())},
+            "lock_wait": {var_id: {"waits": waits, "ticks": ticks} for var_id, (waits, ticks) in longest},
+            "degraded": {site_id: {"recoveries": recoveries,
+                                   "ticks": ticks + (tm.timestamp - since if site_id in self.stale else 0),
+                                   "stale_copies": len(self.stale.get(site_id, ()))}
+                         for site_id, (recoveries, ticks, since) in sorted(self.degraded.items())},
+            "gc": dict(tm.gc_stats),
+        }
+
+
+    def begin(self, trans_id, read_only):
+        self.output.begin(trans_id, read_only)
+
+
+    def read(self, trans_id, read_only, site_id, var_id, value):
+        self.site_ops[site_id][0] += 1
+        self.output.read(trans_id, read_only, site_id, var_id, value)
+
+
+    def write(self, trans_id, var_id, value, sites):
+        for site_id in sites:
+            self.site_ops[site_id][1] += 1
+        self.output.write(trans_id, var_id, value, sites)
+
+
+    def commit(self, trans_id, timestamp):
+        self.output.commit(trans_id, timestamp)
+
+
+    def abort(self, trans_id, reason):
+        self.aborts[reason] += 1
+        self.output.abort(trans_id, reason)
+
+
+    def deadlock(self, trans_id):
+        self.deadlock_victims += 1
+        self.output.deadlock(trans_id)
+
+
+    def dump_start(self):
+        self.output.dump_start()
+
+
+    def dump_site(self, site_id, up, values):
+        self.output.dump_site(site_id, up, values)
+
+
+    def stats(self, snapshot):
+        self.output.stats(snapshot)
+
+
+    def message(self, text):
+        self.output.message(text)
+
+
+    def flush(self):
+        self.output.flush()
+
+
+    def close(self):
+        self.output.close()
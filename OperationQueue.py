@@ -0,0 +1,148 @@
+import heapq
+from collections import defaultdict
+
+
+class OperationQueue:
+    # attributes the next commands depend on, see TransactionManager.save_state
+    STATE = ("operations", "ready", "ready_set", "deferred", "parked", "transaction_operations", "cursor", "next_seq")
+
+    def __init__(self):
+        """
+        operations (dict -- seq (int) : Operation): pending operations in arrival order
+        ready (list of seq): heap of operations worth (re)trying
+        ready_set (set of seq): members of ready
+        deferred (list of seq): woken during a pass for operations the pass already went by
+        parked (dict -- var_id (str) : set of seq): blocked operations waiting on a variable
+        transaction_operations (dict -- trans_id (str) : set of seq)
+        cursor (int): seq of the operation being tried, None outside of a pass
+        """
+        self.operations = {}
+        self.ready = []
+        self.ready_set = set()
+        self.deferred = []
+        self.parked = defaultdict(set)
+        self.transaction_operations = defaultdict(set)
+        self.cursor = None
+        self.next_seq = 0
+
+
+    def __len__(self):
+        return len(self.operations)
+
+
+    def __iter__(self):
+        return iter(self.operations.values())
+
+
+    def append(self, ope):
+        """
+        add a new operation, it is tried in the next pass
+        ope (Operation)
+        """
+        ope.seq = self.next_seq
+        self.next_seq += 1
+        self.operations[ope.seq] = ope
+        self.transaction_operations[ope.trans_id].add(ope.seq)
+        self.make_ready(ope.seq)
+
+
+    def make_ready(self, seq):
+        if seq in self.ready_set or seq not in self.operations:
+            return
+        if self.cursor is not None and seq <= self.cursor:
+            # a pass only moves forward, like walking the queue once
+            self.deferred.append(seq)
+            return
+        self.ready_set.add(seq)
+        heapq.heappush(self.ready, seq)
+
+
+    def pop_ready(self):
+        """
+        yield the operations worth trying in arrival order
+        an operation woken during the pass is retried in the same pass if it arrived after the current one,
+        otherwise in the next pass
+        """
+        while self.ready:
+            seq = heapq.heappop(self.ready)
+            self.ready_set.discard(seq)
+            if seq not in self.operations:
+                continue
+            self.cursor = seq
+            yield self.operations[seq]
+        self.cursor = None
+        deferred, self.deferred = self.deferred, []
+        for seq in deferred:
+            self.make_ready(seq)
+
+
+    def park(self, ope):
+        """
+        the operation is blocked, wait until the lock of one of its variables changes
+        ope (Operation)
+        """
+        for var_id in ope.variables():
+            self.parked[var_id].add(ope.seq)
+
+
+    def remove(self, ope):
+        """
+        the operation is done
+        ope (Operation)
+        """
+        self.operations.pop(ope.seq, None)
+        # a multi-variable operation may still be parked on the variables that did not wake it
+        self.unpark(ope)
+        seqs = self.transaction_operations.get(ope.trans_id)
+        if seqs is not None:
+            seqs.discard(ope.seq)
+            if not seqs:
+                del self.transaction_operations[ope.trans_id]
+
+
+    def remove_transaction(self, trans_id):
+        """
+        drop all the pending operations of a finished transaction
+        """
+        for seq in self.transaction_operations.pop(trans_id, ()):
+            ope = self.operations.pop(seq, None)
+            if ope:
+                self.unpark(ope)
+
+
+    def unpark(self, ope):
+        """
+        stop waiting on the variables of a done or dropped operation
+        """
+        for var_id in ope.variables():
+            seqs = self.parked.get(var_id)
+            if seqs is not None:
+                seqs.discard(ope.seq)
+                if not seqs:
+                    del self.parked[var_id]
+
+
+    def wake_variable(self, var_id):
+        """
+        retry the operations waiting on var_id
+        """
+        for seq in self.parked.pop(var_id, ()):
+            self.make_ready(seq)
+
+
+    def on_lock_change(self, site_id, var_id, lock_manager):
+        """
+        lock listener of DataManager
+        """
+        if var_id in self.parked:
+            self.wake_variable(var_id)
+
+
+    def wake_site(self, dm):
+        """
+        retry the operations waiting on variables of a site going up or down
+        dm (DataManager)
+        """
+        for var_id in list(self.parked):
+            if dm.hosts(var_id):
+                self.wake_variable(var_id)
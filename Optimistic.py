@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+
+class OptimisticControl:
+    STATE = ("read_sets", "write_sets", "last_commit")
+
+    def __init__(self, tm):
+        """
+        runs read-write transactions without locks: reads see the latest committed value, writes are kept
+        by the transaction until end, which validates its reads and then installs its writes at every
+        working copy. Read-only transactions keep reading their snapshot.
+        tm (TransactionManager)
+        read_sets (dict -- trans_id : dict -- var_id : timestamp): commit time of the version each variable was read at
+        write_sets (dict -- trans_id : dict -- var_id : value): values written and not committed yet
+        last_commit (dict -- var_id : timestamp): when a transaction last committed a write to the variable
+        """
+        self.tm = tm
+        self.read_sets = defaultdict(dict)
+        self.write_sets = defaultdict(dict)
+        self.last_commit = {}
+
+
+    def read(self, trans_id, var_id):
+        """
+        read the latest committed value from the first working copy still available, or the value
+        the transaction wrote itself
+        Return (site_id, value): None if no copy can be read
+        """
+        for dm in self.tm.read_replicas(trans_id, var_id):
+            res, val, timestamp = dm.read_latest(var_id)
+            if res:
+                written = self.write_sets.get(trans_id)
+                if written and var_id in written:
+                    val = written[var_id]
+                else:
+                    self.read_sets[trans_id].setdefault(var_id, timestamp)
+                # abort the transaction if this site fails before it ends
+                dm.visited_transaction.add(trans_id)
+                return dm.site_id, val
+        return None
+
+
+    def write(self, trans_id, var_id, value):
+        """
+        keep the value for the commit, the working copies are those it will be installed at if they stay up
+        """
+        self.write_sets[trans_id][var_id] = value
+        sites = []
+        for dm in self.tm.catalog.up_replicas_of(var_id):
+            dm.visited_transaction.add(trans_id)
+            sites.append(dm.site_id)
+        self.tm.output.write(trans_id, var_id, value, sites)
+
+
+    def validate(self, trans_id):
+        """
+        Return (bool): whether no transaction committed a write to a variable trans_id read since the version it read
+        """
+        last_commit = self.last_commit
+        for var_id, timestamp in self.read_sets.get(trans_id, {}).items():
+            if last_commit.get(var_id, timestamp) > timestamp:
+                return False
+        return True
+
+
+    def commit(self, trans_id, timestamp):
+        """
+        install the writes of a validated transaction at the working copies of their variables
+        """
+        self.read_sets.pop(trans_id, None)
+        writes = self.write_sets.pop(trans_id, None)
+        if not writes:
+            return
+        per_site = defaultdict(list)
+        for var_id, value in writes.items():
+            self.last_commit[var_id] = timestamp
+            for dm in self.tm.catalog.up_replicas_of(var_id):
+                per_site[dm].append((var_id, value))
+        self.tm.run_on_sites(list(per_site), lambda dm: dm.install(timestamp, per_site[dm]))
+
+
+    def forget(self, trans_id):
+        """
+        drop what an aborted transaction read and wrote
+        """
+        self.read_sets.pop(trans_id, None)
+        self.write_sets.pop(trans_id, None)
@@ -0,0 +1,231 @@
+import json
+import sys
+from ErrorHandler import InvalidInputError
+
+
+class Sink:
+    """
+    receives the events of TransactionManager and DataManager, drops them
+    """
+    def begin(self, trans_id, read_only):
+        pass
+
+
+    def read(self, trans_id, read_only, site_id, var_id, value):
+        pass
+
+
+    def write(self, trans_id, var_id, value, sites):
+        pass
+
+
+    def commit(self, trans_id, timestamp):
+        pass
+
+
+    def abort(self, trans_id, reason):
+        pass
+
+
+    def deadlock(self, trans_id):
+        pass
+
+
+    def dump_start(self):
+        pass
+
+
+    def dump_site(self, site_id, up, values):
+        """
+        site_id (int)
+        up (bool)
+        values (list of (var_id, value)): committed values held by the site, ascending by variable
+        """
+        pass
+
+
+    def stats(self, snapshot):
+        """
+        snapshot (dict): counters of Metrics.snapshot
+        """
+        pass
+
+
+    def message(self, text):
+        """
+        a line that is not an event, like which input is read
+        """
+        pass
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        self.flush()
+
+
+class NullSink(Sink):
+    """
+    discards all output, for benchmarks
+    """
+
+
+class BufferedSink(Sink):
+    def __init__(self, stream=None, buffer_lines=4096):
+        """
+        joins its lines into one write every buffer_lines lines
+        stream (file): standard output by default
+        """
+        self.stream = stream if stream else sys.stdout
+        self.buffer_lines = buffer_lines
+        self.buffer = []
+
+
+    def emit(self, line):
+        self.buffer.append(line)
+        if len(self.buffer) >= self.buffer_lines:
+            self.flush()
+
+
+    def flush(self):
+        if self.buffer:
+            self.buffer.append("")
+            self.stream.write("\n".join(self.buffer))
+            self.buffer = []
+        self.stream.flush()
+
+
+class TextSink(BufferedSink):
+    """
+    the human readable output, the same text as printing each event
+    """
+    def begin(self, trans_id, read_only):
+        if read_only:
+            self.emit("Read-only transaction {} begins".format(trans_id))
+        else:
+            self.emit("Transaction {} begins".format(trans_id))
+
+
+    def read(self, trans_id, read_only, site_id, var_id, value):
+        if read_only:
+            self.emit("Read-only transaction {} read from site {} ==> Result: {}: {}".format(trans_id, site_id, var_id, value))
+        else:
+            self.emit("Transaction {} read from site {} ==> Result: {}: {}".format(trans_id, site_id, var_id, value))
+
+
+    def write(self, trans_id, var_id, value, sites):
+        self.emit("Transaction {} write value {} to {} in sites {}".format(trans_id, value, var_id, sites))
+
+
+    def commit(self, trans_id, timestamp):
+        self.emit("Transaction {} commits at time {}".format(trans_id, timestamp))
+
+
+    def abort(self, trans_id, reason):
+        self.emit("Transaction {} is aborted because of {}".format(trans_id, reason))
+
+
+    def deadlock(self, trans_id):
+        self.emit("Deadlock exists: transaction {} is aborted".format(trans_id))
+
+
+    def dump_start(self):
+        self.emit("Dumping...")
+
+
+    def dump_site(self, site_id, up, values):
+        self.emit("[{}]Site {} ".format("UP" if up else "DOWN", site_id)
+                  + "".join(["-- {}: {} ".format(var_id, value) for var_id, value in values]))
+
+
+    def stats(self, snapshot):
+        self.emit("Stats at time {}".format(snapshot["timestamp"]))
+        for name, timer in snapshot["timers"].items():
+            self.emit("-- {}: {} calls, {} ms".format(name, timer["calls"], timer["ms"]))
+        depth = snapshot["queue_depth"]
+        self.emit("-- queue depth: {} now, {} max, {} mean".format(depth["current"], depth["max"], depth["mean"]))
+        self.emit("-- aborts: {} deadlock, {} site failure, {} deadlock victims".format(
+            snapshot["aborts"].get("deadlock", 0), snapshot["aborts"].get("site failure", 0), snapshot["deadlock_victims"]))
+        self.emit("-- site ops: " + ", ".join(["site {}: {} reads {} writes".format(site_id, ops["reads"], ops["writes"])
+                                                for site_id, ops in snapshot["site_ops"].items()]))
+        self.emit("-- lock wait: " + ", ".join(["{}: {} ticks over {} operations".format(var_id, wait["ticks"], wait["waits"])
+                                                 for var_id, wait in snapshot["lock_wait"].items()]))
+        if snapshot["degraded"]:
+            self.emit("-- degraded: " + ", ".join(["site {}: {} ticks over {} recoveries, {} stale copies".format(
+                site_id, degraded["ticks"], degraded["recoveries"], degraded["stale_copies"])
+                for site_id, degraded in snapshot["degraded"].items()]))
+        gc = snapshot["gc"]
+        self.emit("-- version gc: {} passes, {} versions reclaimed, {} bytes saved".format(
+            gc["passes"], gc["versions_reclaimed"], gc["bytes_saved"]))
+
+
+    def message(self, text):
+        self.emit(text)
+
+
+class JsonSink(BufferedSink):
+    """
+    one JSON object per event and per line, the "event" key names the event
+    """
+    def event(self, **fields):
+        self.emit(json.dumps(fields, separators=(",", ":")))
+
+
+    def begin(self, trans_id, read_only):
+        self.event(event="begin", trans_id=trans_id, read_only=read_only)
+
+
+    def read(self, trans_id, read_only, site_id, var_id, value):
+        self.event(event="read", trans_id=trans_id, read_only=read_only, site_id=site_id, var_id=var_id, value=value)
+
+
+    def write(self, trans_id, var_id, value, sites):
+        self.event(event="write", trans_id=trans_id, var_id=var_id, value=value, sites=sites)
+
+
+    def commit(self, trans_id, timestamp):
+        self.event(event="commit", trans_id=trans_id, timestamp=timestamp)
+
+
+    def abort(self, trans_id, reason):
+        self.event(event="abort", trans_id=trans_id, reason=reason)
+
+
+    def deadlock(self, trans_id):
+        self.event(event="deadlock", trans_id=trans_id)
+
+
+    def dump_start(self):
+        pass
+
+
+    def dump_site(self, site_id, up, values):
+        self.event(event="dump", site_id=site_id, up=up, values=dict(values))
+
+
+    def stats(self, snapshot):
+        self.event(event="stats", **snapshot)
+
+
+    def message(self, text):
+        self.event(event="message", text=text)
+
+
+SINKS = {
+    "text": TextSink,
+    "jsonl": JsonSink,
+    "null": NullSink,
+}
+
+
+def make_sink(name, stream=None):
+    """
+    build an output sink by its name in SINKS
+    """
+    if name not in SINKS:
+        raise InvalidInputError("ERROR: unknown output {}".format(name))
+    if name == "null":
+        return NullSink()
+    return SINKS[name](stream)
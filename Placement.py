@@ -0,0 +1,159 @@
+import re
+from itertools import chain
+from ErrorHandler import InvalidInputError
+
+VAR_PATTERN = re.compile(r"x(\d+)$")
+
+
+class Placement:
+    def __init__(self, num_sites, num_variables, replication=1):
+        """
+        decides which sites hold a copy of each variable x1 .. x(num_variables)
+        num_sites (int)
+        num_variables (int)
+        replication (int): number of copies of a variable
+        """
+        if num_sites < 1 or num_variables < 1:
+            raise InvalidInputError("ERROR: a cluster needs at least one site and one variable")
+        if replication < 1 or replication > num_sites:
+            raise InvalidInputError("ERROR: replication factor must be between 1 and {}".format(num_sites))
+        self.num_sites = num_sites
+        self.num_variables = num_variables
+        self.replication = replication
+        self.site_variables = None
+
+
+    def var_number(self, var_id):
+        """
+        var_id (str): "x12"
+        Return (int): 12, or None if var_id is not a variable of the cluster
+        """
+        match = VAR_PATTERN.match(var_id)
+        if not match:
+            return None
+        i = int(match.group(1))
+        if i < 1 or i > self.num_variables:
+            return None
+        return i
+
+
+    def sites_of(self, i):
+        """
+        i (int): variable number
+        Return (list of int): ids of the sites holding a copy, ascending
+        """
+        first = self.first_site(i)
+        return sorted((first - 1 + k) % self.num_sites + 1 for k in range(self.replication))
+
+
+    def first_site(self, i):
+        """
+        i (int): variable number
+        Return (int): the site of the first copy, the other copies are on the next sites;
+            site i % num_sites + 1 unless a placement decides otherwise
+        """
+        return i % self.num_sites + 1
+
+
+    def is_replicated(self, i, site_id):
+        """
+        whether the copy of variable i at site_id is one of several,
+        a replicated copy cannot be read after its site recovers until a write commits
+        """
+        return self.replication > 1
+
+
+    def hosts(self, site_id, var_id):
+        """
+        whether site_id holds a copy of var_id
+        """
+        i = self.var_number(var_id)
+        return i is not None and site_id in self.sites_of(i)
+
+
+    def variables_at(self, site_id):
+        """
+        Return (list of int): numbers of the variables held by site_id, ascending
+        """
+        if self.site_variables is None:
+            # one pass over the variables fills the lists of all sites, they are shared only once complete
+            # as the sites of --site-workers may ask at the same time
+            site_variables = [[] for _ in range(self.num_sites + 1)]
+            for i in range(1, self.num_variables + 1):
+                for s in self.sites_of(i):
+                    site_variables[s].append(i)
+            self.site_variables = site_variables
+        return self.site_variables[site_id]
+
+
+    def initial_value(self, i):
+        return 10 * i
+
+
+class DefaultPlacement(Placement):
+    """
+    even variables are at all sites, odd variable xi is at site i % num_sites + 1
+    """
+    def __init__(self, num_sites=10, num_variables=20, replication=None):
+        super().__init__(num_sites, num_variables, num_sites)
+
+
+    def sites_of(self, i):
+        if i % 2 == 0:
+            return list(range(1, self.num_sites + 1))
+        return [i % self.num_sites + 1]
+
+
+    def is_replicated(self, i, site_id):
+        # the copy at site i % num_sites + 1 is that site's own, even for an even variable
+        return i % 2 == 0 and i % self.num_sites + 1 != site_id
+
+
+    def variables_at(self, site_id):
+        # odd variables xi with i % num_sites == site_id - 1
+        own = range(site_id - 1 if site_id > 1 else self.num_sites, self.num_variables + 1, self.num_sites)
+        return sorted(chain(range(2, self.num_variables + 1, 2), (i for i in own if i % 2)))
+
+
+class HashPlacement(Placement):
+    """
+    the copies of a variable are on consecutive sites starting from a hashed one
+    """
+    def first_site(self, i):
+        # Knuth's multiplicative hash spreads neighbouring variables over the sites
+        return (i * 2654435761) % (2 ** 32) % self.num_sites + 1
+
+
+class RangePlacement(Placement):
+    """
+    variables are split into num_sites contiguous ranges, range k starts at site k
+    """
+    def first_site(self, i):
+        return (i - 1) * self.num_sites // self.num_variables + 1
+
+
+    def variables_at(self, site_id):
+        res = []
+        for k in range(self.replication):
+            first = (site_id - 1 - k) % self.num_sites
+            # variables whose range starts at site first + 1
+            lo = -(-first * self.num_variables // self.num_sites) + 1
+            hi = -(-(first + 1) * self.num_variables // self.num_sites)
+            res.extend(range(lo, hi + 1))
+        return sorted(res)
+
+
+PLACEMENTS = {
+    "default": DefaultPlacement,
+    "hash": HashPlacement,
+    "range": RangePlacement,
+}
+
+
+def make_placement(name, num_sites, num_variables, replication):
+    """
+    build a placement by its name in PLACEMENTS
+    """
+    if name not in PLACEMENTS:
+        raise InvalidInputError("ERROR: unknown placement {}".format(name))
+    return PLACEMENTS[name](num_sites, num_variables, replication)
@@ -0,0 +1,103 @@
+import zlib
+from collections import defaultdict
+from ErrorHandler import InvalidInputError
+
+
+class FirstReplica:
+    """
+    try the working copies in site order, every read of a replicated variable goes to the lowest working site
+    reads (dict -- site_id : int): reads each site served
+    """
+    STATE = ("reads",)
+
+    def __init__(self, num_sites):
+        self.num_sites = num_sites
+        self.reads = defaultdict(int)
+
+
+    def order(self, trans_id, var_id, dms):
+        """
+        trans_id (str): the reading transaction
+        var_id (str)
+        dms (list of DataManager): the working copies of var_id, in site order
+        Return (list of DataManager): the copies in the order a read tries them
+        """
+        return dms
+
+
+    def served(self, site_id):
+        """
+        a read was served by site_id
+        """
+        self.reads[site_id] += 1
+
+
+class RoundRobin(FirstReplica):
+    """
+    each read of a variable starts from the copy after the one the previous read of it started from
+    turns (dict -- var_id : int): reads of each variable so far
+    """
+    STATE = ("reads", "turns")
+
+    def __init__(self, num_sites):
+        super().__init__(num_sites)
+        self.turns = defaultdict(int)
+
+
+    def order(self, trans_id, var_id, dms):
+        if len(dms) < 2:
+            return dms
+        turn = self.turns[var_id] % len(dms)
+        self.turns[var_id] += 1
+        return dms[turn:] + dms[:turn]
+
+
+class LeastQueued(FirstReplica):
+    """
+    try first the copies with the fewest lock requests queued on the variable, then those which served the fewest reads
+    """
+    def order(self, trans_id, var_id, dms):
+        if len(dms) < 2:
+            return dms
+        reads = self.reads
+
+        def load(dm):
+            lm = dm.lock_table.get(var_id)
+            return len(lm.lock_queue) if lm else 0, reads[dm.site_id]
+        return sorted(dms, key=load)
+
+
+class Locality(FirstReplica):
+    """
+    a transaction reads from its home site when it holds the variable, otherwise from the next ones, so
+    that its locks stay on few sites while different transactions spread over all of them
+    """
+    def order(self, trans_id, var_id, dms):
+        if len(dms) < 2:
+            return dms
+        home = self.home(trans_id)
+        return sorted(dms, key=lambda dm: (dm.site_id - home) % self.num_sites)
+
+
+    def home(self, trans_id):
+        """
+        Return (int): the site trans_id prefers, the same in every run
+        """
+        return zlib.crc32(trans_id.encode()) % self.num_sites + 1
+
+
+SELECTORS = {
+    "first": FirstReplica,
+    "round-robin": RoundRobin,
+    "least-queued": LeastQueued,
+    "locality": Locality,
+}
+
+
+def make_selector(name, num_sites):
+    """
+    build a replica selection by its name in SELECTORS
+    """
+    if name not in SELECTORS:
+        raise InvalidInputError("ERROR: unknown replica selection {}".format(name))
+    return SELECTORS[name](num_sites)
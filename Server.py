@@ -0,0 +1,295 @@
+import asyncio
+import io
+from collections import defaultdict, deque
+from Output import Sink, TextSink
+from ErrorHandler import InvalidInputError
+
+
+class SessionRouter(Sink):
+    def __init__(self, server):
+        """
+        the output of the shared TransactionManager, each event goes back to the client waiting for it
+        text (TextSink): formats the events as in the text output
+        """
+        self.server = server
+        self.text = TextSink(io.StringIO())
+
+
+    def line(self):
+        return self.text.buffer.pop()
+
+
+    def begin(self, trans_id, read_only):
+        self.text.begin(trans_id, read_only)
+        self.server.reply(self.line())
+
+
+    def read(self, trans_id, read_only, site_id, var_id, value):
+        self.text.read(trans_id, read_only, site_id, var_id, value)
+        self.server.operation_done(trans_id, "R", var_id, self.line())
+
+
+    def write(self, trans_id, var_id, value, sites):
+        self.text.write(trans_id, var_id, value, sites)
+        self.server.operation_done(trans_id, "W", var_id, self.line())
+
+
+    def commit(self, trans_id, timestamp):
+        self.text.commit(trans_id, timestamp)
+        self.server.reply(self.line())
+
+
+    def abort(self, trans_id, reason):
+        self.text.abort(trans_id, reason)
+        self.server.transaction_aborted(trans_id, self.line())
+
+
+    def deadlock(self, trans_id):
+        self.text.deadlock(trans_id)
+        self.server.transaction_aborted(trans_id, self.line())
+
+
+    def dump_start(self):
+        self.text.dump_start()
+        self.server.reply(self.line())
+
+
+    def dump_site(self, site_id, up, values):
+        self.text.dump_site(site_id, up, values)
+        self.server.reply(self.line())
+
+
+    def stats(self, snapshot):
+        self.text.stats(snapshot)
+        lines, self.text.buffer = self.text.buffer, []
+        for line in lines:
+            self.server.reply(line)
+
+
+    def message(self, text):
+        self.server.reply(text)
+
+
+class Server:
+    def __init__(self, trans_manager):
+        """
+        serves one TransactionManager to many clients, a single sequencer task runs their commands in turn
+        a client sends a command per line and gets back the output of each command followed by an empty line,
+        the answer to R or W comes when the operation runs, or when its transaction is aborted
+        trans_manager (TransactionManager): its output is replaced by a SessionRouter
+        commands (asyncio.Queue of (line, future, began)): lines waiting for the sequencer, a None future
+            when the client who began the transactions of began disconnected
+        pending (dict -- trans_id : list of (operation type, var_id, future)): operations not run yet, a
+            multi-read or multi-write has an entry per variable, all with the same future
+        answers (dict -- future : list of str): lines of a multi-variable operation whose variables are not all done
+        aborted_lines (dict -- trans_id : list of str): deadlock and abort lines of a victim, kept until its
+            next command when it was aborted while waiting for none, as a wounded transaction is
+        current (list of str): output of the command being run
+        subject (str): transaction of the command being run
+        sessions (int): clients connected
+        commands_run (int)
+        """
+        self.tm = trans_manager
+        router = SessionRouter(self)
+        if trans_manager.metrics:
+            # keep counting in front of the router
+            trans_manager.metrics.output = router
+        else:
+            trans_manager.output = router
+            for dm in trans_manager.data_manager_list:
+                dm.output = router
+        self.commands = None
+        self.pending = defaultdict(list)
+        self.answers = {}
+        self.aborted_lines = defaultdict(list)
+        self.current = None
+        self.subject = None
+        self.sessions = 0
+        self.commands_run = 0
+
+
+    def reply(self, line):
+        self.current.append(line)
+
+
+    def operation_done(self, trans_id, operation_type, var_id, line):
+        pending = self.pending.get(trans_id, ())
+        for k, (ope_type, ope_var_id, future) in enumerate(pending):
+            if ope_type == operation_type and ope_var_id == var_id:
+                del pending[k]
+                lines = self.answers.pop(future, [])
+                lines.append(line)
+                if any(f is future for _, _, f in pending):
+                    self.answers[future] = lines
+                else:
+                    future.set_result(lines)
+                return
+        self.reply(line)
+
+
+    def transaction_aborted(self, trans_id, line):
+        """
+        a deadlock victim is told through the operations it waits on, an ended transaction through its end,
+        any other through its next command
+        """
+        self.aborted_lines[trans_id].append(line)
+        if line.startswith("Deadlock"):
+            return
+        lines = self.aborted_lines.pop(trans_id)
+        pending = self.pending.pop(trans_id, ())
+        for _, _, future in pending:
+            self.answers.pop(future, None)
+            if not future.done():
+                future.set_result(lines)
+        if not pending:
+            if trans_id == self.subject:
+                self.current.extend(lines)
+            else:
+                self.aborted_lines[trans_id] = lines
+
+
+    def run(self, line, future, began):
+        """
+        run a command of a client, the future gets its output
+        began (set of trans_id): transactions the client began
+        """
+        self.current = []
+        waits = False
+        try:
+            command = self.tm.parser.translate(line)
+            self.subject = command[1] if command and len(command) > 1 else None
+            self.current.extend(self.aborted_lines.pop(self.subject, ()))
+            if command and command[0] in ("begin", "beginRO"):
+                began.add(command[1])
+            if command and command[0] in ("R", "W"):
+                self.pending[command[1]].append((command[0], command[2], future))
+                waits = True
+            elif command and command[0] in ("MR", "MW", "SCAN"):
+                if command[0] == "MR":
+                    var_ids = command[2:]
+                elif command[0] == "MW":
+                    var_ids = command[2::2]
+                else:
+                    var_ids = self.tm.scan_range(command[2], command[3])
+                ope_type = "W" if command[0] == "MW" else "R"
+                for var_id in dict.fromkeys(var_ids):
+                    self.pending[command[1]].append((ope_type, var_id, future))
+                waits = True
+            if command:
+                self.tm.run_command(command)
+                self.tm.resolve_deadlocks()
+                self.commands_run += 1
+        except Exception as e:
+            # a failed command, even from a bug or a disk error, must not stop the sequencer
+            self.current.append(e.message if isinstance(e, InvalidInputError) else "ERROR: {}".format(e))
+            if waits:
+                self.drop(command[1], future)
+                waits = False
+        if not waits and not future.done():
+            future.set_result(self.current)
+
+
+    def disconnect(self, began):
+        """
+        abort the transactions a client left running
+        """
+        self.current = []
+        for trans_id in began:
+            self.aborted_lines.pop(trans_id, None)
+            self.subject = trans_id
+            trans = self.tm.transaction_table.get(trans_id)
+            if trans:
+                trans.aborted = True
+                trans.abort_reason = "client disconnect"
+                try:
+                    self.tm.run_command(("end", trans_id))
+                    self.tm.resolve_deadlocks()
+                except Exception:
+                    pass
+
+
+    def drop(self, trans_id, future):
+        ops = self.pending.get(trans_id, [])
+        ops[:] = [op for op in ops if op[2] is not future]
+        self.answers.pop(future, None)
+
+
+    async def sequencer(self):
+        while True:
+            line, future, began = await self.commands.get()
+            if future is None:
+                self.disconnect(began)
+            else:
+                self.run(line, future, began)
+
+
+    async def session(self, reader, writer):
+        """
+        serve one client until it disconnects, its running transactions are then aborted
+        """
+        self.sessions += 1
+        began = set()
+        loop = asyncio.get_running_loop()
+        # lines sent while a command waited, and the read of the next one
+        received = deque()
+        reading = None
+        try:
+            while True:
+                if received:
+                    data = received.popleft()
+                elif reading:
+                    data = await reading
+                    reading = None
+                else:
+                    data = await reader.readline()
+                if not data or data.strip() == b"QUIT":
+                    break
+                future = loop.create_future()
+                self.commands.put_nowait((data.decode(), future, began))
+                while not future.done():
+                    # keep reading, a client leaving while its command waits is noticed at once
+                    reading = reading or loop.create_task(reader.readline())
+                    await asyncio.wait((future, reading), return_when=asyncio.FIRST_COMPLETED)
+                    if reading.done():
+                        data = reading.result()
+                        reading = None
+                        if not data:
+                            return
+                        received.append(data)
+                writer.write(("\n".join(future.result() + [""]) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if reading:
+                reading.cancel()
+            self.sessions -= 1
+            self.commands.put_nowait((None, None, began))
+            writer.close()
+
+
+    async def start(self, address):
+        """
+        address (str): "host:port" for TCP or "unix:path" for a Unix socket
+        Return (asyncio.Server)
+        """
+        self.commands = asyncio.Queue()
+        asyncio.get_running_loop().create_task(self.sequencer())
+        if address.startswith("unix:"):
+            return await asyncio.start_unix_server(self.session, address[len("unix:"):], backlog=1024)
+        host, port = address.rsplit(":", 1)
+        return await asyncio.start_server(self.session, host, int(port), backlog=1024)
+
+
+def serve(trans_manager, address):
+    """
+    serve trans_manager at address until interrupted
+    """
+    async def main():
+        server = await Server(trans_manager).start(address)
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
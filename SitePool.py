@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SitePool:
+    def __init__(self, workers):
+        """
+        runs the same work on several sites at once, in threads
+        the time a site spends waiting on its disk, like the fsync of a commit, overlaps with the other sites
+        workers (int): number of threads
+        """
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="site")
+
+
+    def map(self, func, dms):
+        """
+        call func(dm) for every site of dms in parallel
+        lock changes are held back while the sites work, then told to the listeners site by site, in the
+        order of dms, so that what happens next does not depend on which thread finished first
+        func (callable(DataManager))
+        dms (list of DataManager)
+        Return (list): the results in the order of dms, the exception of the first failing site is raised
+        """
+        if len(dms) < 2:
+            return [func(dm) for dm in dms]
+        for dm in dms:
+            dm.held_notifications = []
+        try:
+            futures = [self.executor.submit(func, dm) for dm in dms]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append((future.result(), None))
+                except Exception as e:
+                    outcomes.append((None, e))
+        finally:
+            for dm in dms:
+                held, dm.held_notifications = dm.held_notifications, None
+                for var_id in held:
+                    dm.notify_lock_change(var_id)
+        for result, error in outcomes:
+            if error:
+                raise error
+        return [result for result, _ in outcomes]
+
+
+    def close(self):
+        self.executor.shutdown()
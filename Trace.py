@@ -0,0 +1,226 @@
+import json
+import os
+import pickle
+import zlib
+from Output import Sink
+
+TRACE = "trace.txt"
+OPTIONS = "options.json"
+
+
+def snapshot_path(directory, position):
+    return os.path.join(directory, "snapshot-{:010d}.pkl".format(position))
+
+
+def command_line(command):
+    """
+    Return (str): the input line of a translated command
+    """
+    return "{}({})".format(command[0], ",".join(str(arg) for arg in command[1:]))
+
+
+class DigestSink(Sink):
+    """
+    sits in front of an output to checksum the events of each command, stats are left out as they hold timings
+    output (Sink): where the events are forwarded
+    crc (int): checksum of the events since the last call to take
+    """
+    def __init__(self, output):
+        self.output = output
+        self.crc = 0
+
+
+    def add(self, *event):
+        self.crc = zlib.crc32(repr(event).encode(), self.crc)
+
+
+    def take(self):
+        """
+        Return (int): the checksum of the events since the previous call
+        """
+        crc, self.crc = self.crc, 0
+        return crc
+
+
+    def begin(self, trans_id, read_only):
+        self.add("begin", trans_id, read_only)
+        self.output.begin(trans_id, read_only)
+
+
+    def read(self, trans_id, read_only, site_id, var_id, value):
+        self.add("read", trans_id, read_only, site_id, var_id, value)
+        self.output.read(trans_id, read_only, site_id, var_id, value)
+
+
+    def write(self, trans_id, var_id, value, sites):
+        self.add("write", trans_id, var_id, value, sites)
+        self.output.write(trans_id, var_id, value, sites)
+
+
+    def commit(self, trans_id, timestamp):
+        self.add("commit", trans_id, timestamp)
+        self.output.commit(trans_id, timestamp)
+
+
+    def abort(self, trans_id, reason):
+        self.add("abort", trans_id, reason)
+        self.output.abort(trans_id, reason)
+
+
+    def deadlock(self, trans_id):
+        self.add("deadlock", trans_id)
+        self.output.deadlock(trans_id)
+
+
+    def dump_start(self):
+        self.add("dump")
+        self.output.dump_start()
+
+
+    def dump_site(self, site_id, up, values):
+        self.add("dump_site", site_id, up, values)
+        self.output.dump_site(site_id, up, values)
+
+
+    def stats(self, snapshot):
+        self.output.stats(snapshot)
+
+
+    def message(self, text):
+        self.output.message(text)
+
+
+    def flush(self):
+        self.output.flush()
+
+
+    def close(self):
+        self.output.close()
+
+
+class TraceRecorder:
+    def __init__(self, directory, digest, snapshot_interval=1000):
+        """
+        writes the commands a TransactionManager runs to directory/trace.txt, each followed by the checksum
+        of its output as a comment, so the trace is also an input script, and pickles the state of the
+        TransactionManager to directory/snapshot-<commands run>.pkl every snapshot_interval commands
+        digest (DigestSink): the output of the TransactionManager
+        commands (int): commands recorded so far
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith("snapshot-"):
+                # left by an earlier recording
+                os.remove(os.path.join(directory, name))
+        self.directory = directory
+        self.digest = digest
+        self.snapshot_interval = snapshot_interval
+        self.trace = open(os.path.join(directory, TRACE), "w")
+        self.commands = 0
+
+
+    def attach(self, tm, options):
+        """
+        record the commands tm runs from now on
+        options (dict): keyword arguments tm was built with, a replay builds its TransactionManager from them
+        """
+        with open(os.path.join(self.directory, OPTIONS), "w") as f:
+            json.dump(options, f, indent=2, sort_keys=True)
+        self.save_snapshot(tm)
+        run_command = tm.run_command
+
+        def recorded_run_command(command):
+            self.digest.take()
+            try:
+                run_command(command)
+            except Exception as e:
+                # a bad command is part of what the trace reproduces
+                self.digest.add("error", str(e))
+                raise
+            finally:
+                self.trace.write("{} // {:08x}\n".format(command_line(command), self.digest.take()))
+                self.commands += 1
+            if self.snapshot_interval and self.commands % self.snapshot_interval == 0:
+                self.save_snapshot(tm)
+
+        tm.run_command = recorded_run_command
+
+
+    def save_snapshot(self, tm):
+        with open(snapshot_path(self.directory, self.commands), "wb") as f:
+            pickle.dump(tm.save_state(), f, pickle.HIGHEST_PROTOCOL)
+
+
+    def close(self):
+        self.trace.close()
+
+
+class TraceReader:
+    def __init__(self, directory):
+        """
+        a trace written by TraceRecorder
+        options (dict): keyword arguments of the recorded TransactionManager
+        lines (list of str): the recorded commands as input lines
+        crcs (list of int): checksum of the output of each command
+        snapshots (list of int): number of commands run before each snapshot, ascending
+        """
+        self.directory = directory
+        with open(os.path.join(directory, OPTIONS)) as f:
+            self.options = json.load(f)
+        self.lines = []
+        self.crcs = []
+        with open(os.path.join(directory, TRACE)) as f:
+            for line in f:
+                command, crc = line.rsplit("//", 1)
+                self.lines.append(command.strip())
+                self.crcs.append(int(crc, 16))
+        self.snapshots = sorted(int(name[9:-4]) for name in os.listdir(directory)
+                                if name.startswith("snapshot-") and name.endswith(".pkl"))
+
+
+    def nearest_snapshot(self, position):
+        """
+        Return (int): the last snapshot taken before command position runs
+        """
+        return max(k for k in self.snapshots if k <= position)
+
+
+    def restore(self, tm, snapshot):
+        """
+        bring tm to the state recorded after snapshot commands
+        """
+        with open(snapshot_path(self.directory, snapshot), "rb") as f:
+            tm.restore_state(pickle.load(f))
+
+
+    def fast_forward(self, tm, position):
+        """
+        bring tm to the state after the first position commands, from the nearest snapshot
+        Return (int): the snapshot it resumed from
+        """
+        snapshot = self.nearest_snapshot(position)
+        self.restore(tm, snapshot)
+        for line in self.lines[snapshot:position]:
+            tm.get_command(line)
+        return snapshot
+
+
+    def find_divergence(self, tm, digest):
+        """
+        replay every interval between two snapshots from its own snapshot and compare the output of each
+        command with the recording
+        digest (DigestSink): the output of tm
+        Return (int): the first command whose output differs, None if none does
+        """
+        ends = self.snapshots[1:] + [len(self.lines)]
+        for snapshot, end in zip(self.snapshots, ends):
+            self.restore(tm, snapshot)
+            for position in range(snapshot, end):
+                digest.take()
+                try:
+                    tm.get_command(self.lines[position])
+                except Exception as e:
+                    digest.add("error", str(e))
+                if digest.take() != self.crcs[position]:
+                    return position
+        return None
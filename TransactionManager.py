@@ -1,26 +1,112 @@
 import re
-from DataManager import DataManager
+import sys
 from collections import defaultdict
+from DataManager import DataManager
+from WaitForGraph import WaitForGraph
+from OperationQueue import OperationQueue
+from Placement import DefaultPlacement
+from Catalog import Catalog
+from WriteAheadLog import WriteAheadLog
+from Output import TextSink
+from Metrics import Metrics
+from SitePool import SitePool
+from DeadlockPolicy import make_policy
+from Optimistic import OptimisticControl
+from ReplicaSelection import make_selector
 from ErrorHandler import InvalidInputError
 
+TOKEN = re.compile(r"\w+")
+
+# command name : converters of its arguments, in order
+COMMANDS = {
+    "begin": (sys.intern,),
+    "beginRO": (sys.intern,),
+    "R": (sys.intern, sys.intern),
+    "W": (sys.intern, sys.intern, str),
+    "MR": (sys.intern,),
+    "MW": (sys.intern,),
+    "SCAN": (sys.intern, sys.intern, sys.intern),
+    "dump": (),
+    "end": (sys.intern,),
+    "fail": (int,),
+    "recover": (int,),
+    "stats": (),
+}
+
+# command name : converters of a group of arguments that follows those of COMMANDS, once or more
+REPEATED = {
+    "MR": (sys.intern,),
+    "MW": (sys.intern, str),
+}
+
+
 class Parser:
     done_flag = False
 
     def translate(self, line):
         """
         Translate an input line (str) into command
+        Return (tuple): command name followed by its converted arguments, None for a line without command
         """ 
         if self.done_flag:
             return None
-        line = line.split('//')[0].strip()
+        line = line.split('//', 1)[0].strip()
         if line:
             if line.startswith("==="):
                 self.done_flag = True
                 return None
-            return re.findall(r"[\w]+", line)
+            tokens = TOKEN.findall(line)
+            if not tokens:
+                # a line of punctuation, ignored as before
+                return None
+            command, *args = tokens
+            converters = COMMANDS.get(command)
+            if converters is None:
+                raise InvalidInputError("ERROR: Invalid Input: {}".format(command))
+            if len(args) < len(converters):
+                raise InvalidInputError("ERROR: {} expects {} arguments".format(command, len(converters)))
+            # ids are kept in many locks and sets, share one string per id
+            res = (command,) + tuple(convert(arg) for convert, arg in zip(converters, args))
+            group = REPEATED.get(command)
+            if group:
+                rest = args[len(converters):]
+                if not rest or len(rest) % len(group):
+                    raise InvalidInputError("ERROR: {} expects {} arguments then groups of {}".format(
+                        command, len(converters), len(group)))
+                res += tuple(group[k % len(group)](arg) for k, arg in enumerate(rest))
+            return res
+
+
+    def translate_all(self, lines, commands):
+        """
+        Translate a batch of lines, stopping at the end marker
+        lines (iterable of str)
+        commands (list of tuple): the commands are appended to it, blank and comment lines dropped,
+            it holds those before a bad line if translation raises
+        """
+        for line in lines:
+            command = self.translate(line)
+            if command:
+                commands.append(command)
+            elif self.done_flag:
+                break
+
+
+def state_of(obj):
+    """
+    Return (dict -- attribute : value): the attributes listed in the STATE of obj's class
+    """
+    return {name: getattr(obj, name) for name in obj.STATE}
+
+
+def set_state(obj, state):
+    for name, value in state.items():
+        setattr(obj, name, value)
 
 
 class Transaction:
+    __slots__ = ("trans_id", "timestamp", "read_only", "aborted", "abort_reason", "snapshot")
+
     def __init__(self, trans_id, timestamp, read_only):
         """
         trans_id (str)
@@ -28,39 +114,130 @@ class Transaction:
         read_only (bool)
         aborted (bool)
         abort_reason (str)
+        snapshot (Snapshot): for a read-only transaction, the sites it may read and what it read
         """
         self.trans_id = trans_id
         self.timestamp = timestamp
         self.read_only = read_only
         self.aborted = False
         self.abort_reason = None
+        self.snapshot = None
 
 
 class Operation:
+    __slots__ = ("operation_type", "trans_id", "var_id", "value", "seq")
+
     def __init__(self, operation_type, trans_id, var_id, value=None):
         """
-        operation_type (str): "R" or "W"
+        operation_type (str): "R" or "W", "MR" or "MW" for several variables at once
         trans_id (str)
-        var_id (str)
-        value (int)
+        var_id (str): a tuple of var_id in variable order for MR and MW
+        value (int): a tuple of int for MW, for MR a dict -- var_id : (site_id, value) of the variables read so far
+        seq (int): arrival order, assigned by the OperationQueue
         """
         self.operation_type = operation_type
         self.trans_id = trans_id
         self.var_id = var_id
         self.value = value
+        self.seq = None
+
+
+    def variables(self):
+        """
+        Return (tuple of var_id): the variables the operation works on
+        """
+        return self.var_id if isinstance(self.var_id, tuple) else (self.var_id,)
 
 
 class TransactionManager:
     parser = Parser()
 
-    def __init__(self):
+    def __init__(self, placement=None, max_versions=None, gc_interval=1000,
+                 wal_dir=None, group_commit_ms=5, checkpoint_interval=1000, restore=False, output=None,
+                 metrics=False, stats_interval=0, site_workers=0, deadlock_policy="detect", lock_timeout=0,
+                 concurrency_control="locking", catch_up="off", replica_selection="first", async_commit=False):
+        """
+        placement (Placement): sites and variables of the cluster, 10 sites and 20 variables by default
+        max_versions (int): committed versions kept per variable copy, None for no limit
+        gc_interval (int): collect old versions every gc_interval commands, 0 to never collect
+        wal_dir (str): directory of the write-ahead logs of the sites, None to keep data in memory only
+        group_commit_ms (float): commits within this window share one fsync
+        checkpoint_interval (int): commits a site logs between two checkpoints
+        restore (bool): start the sites from the checkpoints and logs found in wal_dir
+        output (Sink): where the events go, text on standard output by default
+        metrics (bool): count and time the work done, for the stats command
+        stats_interval (int): with metrics, write the stats every stats_interval commands, 0 for never
+        site_workers (int): threads committing, aborting and dumping the sites in parallel, 0 to do it in turn
+        deadlock_policy (str): how deadlocks are handled, a name of DeadlockPolicy.POLICIES
+        lock_timeout (int): with the no-wait policy, commands a transaction may wait for a lock, 0 for none
+        concurrency_control (str): "locking" for strict two-phase locking, "optimistic" to validate
+            read-write transactions at end instead, see OptimisticControl
+        catch_up (str): how a recovered site makes its replicated copies readable again, "off" to wait for
+            a write to commit there, "lazy" to copy the latest committed version of a peer on first read,
+            "bulk" to copy them all when the site recovers
+        replica_selection (str): which working copy a read tries first, a name of ReplicaSelection.SELECTORS
+        async_commit (bool): with wal_dir, report a commit before the fsync of its group instead of after it
+        gc_stats (dict): passes, versions_reclaimed and bytes_saved by version collection
+        handlers (dict -- command name (str) : function): run a translated command
+        """
+        self.placement = placement if placement else DefaultPlacement()
+        self.output = output if output else TextSink()
+        self.metrics = None
+        if metrics:
+            self.metrics = Metrics(self.output, stats_interval)
+            self.output = self.metrics
         self.transaction_table = {}
         self.timestamp = 0
-        self.operation_queue = [] # queue of Operation
+        self.operation_queue = OperationQueue() # queue of Operation
         self.data_manager_list = [] # list of DataManager
+        self.wait_for_graph = WaitForGraph()
+        self.deadlock_policy = make_policy(deadlock_policy, self, lock_timeout)
+        if concurrency_control not in ("locking", "optimistic"):
+            raise InvalidInputError("ERROR: unknown concurrency control {}".format(concurrency_control))
+        self.optimistic = OptimisticControl(self) if concurrency_control == "optimistic" else None
         
-        for i in range(1, 11):
-            self.data_manager_list.append(DataManager(i))
+        for i in range(1, self.placement.num_sites + 1):
+            wal = WriteAheadLog(wal_dir, i, group_commit_ms, checkpoint_interval, restore) if wal_dir else None
+            dm = DataManager(i, self.placement, max_versions, wal, self.output)
+            if self.deadlock_policy.prevents:
+                # no cycle can form, the graph is not needed
+                dm.lock_policy = self.deadlock_policy.may_wait
+            else:
+                dm.lock_listeners.append(self.wait_for_graph.update_lock)
+            dm.lock_listeners.append(self.operation_queue.on_lock_change)
+            self.data_manager_list.append(dm)
+        if restore and wal_dir:
+            # time goes on from the last commit that was made durable
+            self.timestamp = max(dm.clock for dm in self.data_manager_list)
+        self.catalog = Catalog(self.placement, self.data_manager_list)
+        if catch_up not in ("off", "lazy", "bulk"):
+            raise InvalidInputError("ERROR: unknown catch-up mode {}".format(catch_up))
+        self.catch_up = catch_up
+        self.replica_selector = make_selector(replica_selection, self.placement.num_sites)
+        if catch_up != "off":
+            for dm in self.data_manager_list:
+                dm.catch_up_source = self.catalog.peer_version
+        self.gc_interval = gc_interval
+        self.async_commit = async_commit
+        self.site_pool = SitePool(site_workers) if site_workers > 0 else None
+        self.gc_stats = {"passes": 0, "versions_reclaimed": 0, "bytes_saved": 0}
+        # command name : what runs it, see COMMANDS for the arguments
+        self.handlers = {
+            "begin": lambda trans_id: self.begin(trans_id, False),
+            "beginRO": lambda trans_id: self.begin(trans_id, True),
+            "R": self.add_read,
+            "W": self.add_write,
+            "MR": self.add_multi_read,
+            "MW": self.add_multi_write,
+            "SCAN": self.add_scan,
+            "dump": self.dump,
+            "end": self.end,
+            "fail": self.fail,
+            "recover": self.recover,
+            "stats": self.stats,
+        }
+        if self.metrics:
+            self.metrics.instrument(self)
 
 
     def get_command(self, line):
@@ -68,54 +245,121 @@ class TransactionManager:
         process a line of command
         line: A single line of command
         """
-        args = self.parser.translate(line) # command and args or None
-        if args:
-            # print("\nraw line : " + line.strip())
-
-            command = args.pop(0)
-            if command == "begin":
-                self.begin(args[0], False)
-            elif command == "beginRO":
-                self.begin(args[0], True)
-            elif command == "R":
-                self.add_read(args[0], args[1])
-            elif command == "W":
-                self.add_write(args[0], args[1], args[2])
-            elif command == "dump":
-                self.dump()
-            elif command == "end":
-                self.end(args[0])
-            elif command == "fail":
-                self.fail(int(args[0]))
-            elif command == "recover":
-                self.recover(int(args[0]))
-            else:
-                raise InvalidInputError("ERROR: Invalid Input: {}".format(command))
+        command = self.parser.translate(line) # command and args or None
+        if command:
+            self.run_command(command)
+
+
+    def run_batch(self, commands):
+        """
+        process commands translated by Parser.translate_all, one after the other
+        commands (list of tuple)
+        """
+        run_command = self.run_command
+        for command in commands:
+            run_command(command)
+
+
+    def run_command(self, command):
+        """
+        process a translated command
+        command (tuple): command name followed by its arguments
+        """
+        self.handlers[command[0]](*command[1:])
+        self.timestamp += 1
+        self.execute()
+        self.deadlock_policy.resolve()
+        if self.gc_interval and self.timestamp % self.gc_interval == 0:
+            self.collect_versions()
 
-            self.timestamp += 1
-            self.execute()
-            if self.deadlock_detect():
-                self.execute()
-            
 
     def execute(self):
         """
-        Go through the operation queue, execute those could be run
-        If a transaction does not exists, remove it from the operation queue
+        Go through the operations that are new or whose variable changed, execute those could be run
+        A blocked operation is parked on its variable until a lock on it changes or a site holding it fails or recovers
         """
-        for ope in list(self.operation_queue):
-            if not self.transaction_table.get(ope.trans_id):
+        for ope in self.operation_queue.pop_ready():
+            res = False
+            if ope.operation_type == 'R':
+                res = self.read(ope)
+            elif ope.operation_type == 'W':
+                res = self.write(ope)
+            elif ope.operation_type == 'MR':
+                res = self.read_many(ope)
+            elif ope.operation_type == 'MW':
+                res = self.write_many(ope)
+            if res:
                 self.operation_queue.remove(ope)
             else:
-                res = False
-                if ope.operation_type == 'R':
-                    res = self.read(ope)
-                elif ope.operation_type == 'W':
-                    res = self.write(ope)
-                if res:
-                    self.operation_queue.remove(ope)
-        
-        # print("hhh {}".format(len(self.data_manager_list[0].variable_table['x2'].lock_manager.lock_queue)))
+                self.operation_queue.park(ope)
+
+
+    def collect_versions(self):
+        """
+        discard the committed versions that no read-only transaction, running or future, can read
+        """
+        watermark = self.timestamp
+        for trans in self.transaction_table.values():
+            if trans.read_only and trans.timestamp < watermark:
+                watermark = trans.timestamp
+        for dm in self.data_manager_list:
+            versions, nbytes = dm.collect_versions(watermark)
+            self.gc_stats["versions_reclaimed"] += versions
+            self.gc_stats["bytes_saved"] += nbytes
+        self.gc_stats["passes"] += 1
+
+
+    def close(self):
+        """
+        flush what the sites and the output still buffer
+        """
+        for dm in self.data_manager_list:
+            dm.close()
+        if self.site_pool:
+            self.site_pool.close()
+        self.output.close()
+
+
+    def save_state(self):
+        """
+        what the next commands depend on, to fast-forward a TransactionManager built with the same options,
+        metrics are not part of it
+        Return (dict): to pickle at once, it shares its objects with this TransactionManager
+        """
+        if self.data_manager_list[0].wal:
+            raise InvalidInputError("ERROR: the state of sites with a write-ahead log is on disk")
+        return {
+            "timestamp": self.timestamp,
+            "transaction_table": self.transaction_table,
+            "gc_stats": self.gc_stats,
+            "operation_queue": state_of(self.operation_queue),
+            "wait_for_graph": state_of(self.wait_for_graph),
+            "deadlock_policy": state_of(self.deadlock_policy),
+            "optimistic": state_of(self.optimistic) if self.optimistic else None,
+            "replica_selector": state_of(self.replica_selector),
+            "catalog": state_of(self.catalog),
+            "sites": [dm.save_state() for dm in self.data_manager_list],
+        }
+
+
+    def restore_state(self, state):
+        """
+        continue from a state of save_state, the objects the sites and the queue notify are kept
+        state (dict)
+        """
+        self.timestamp = state["timestamp"]
+        self.transaction_table = state["transaction_table"]
+        self.gc_stats = state["gc_stats"]
+        set_state(self.operation_queue, state["operation_queue"])
+        set_state(self.wait_for_graph, state["wait_for_graph"])
+        set_state(self.deadlock_policy, state["deadlock_policy"])
+        if self.optimistic:
+            set_state(self.optimistic, state["optimistic"])
+        set_state(self.replica_selector, state["replica_selector"])
+        set_state(self.catalog, state["catalog"])
+        for dm, site_state in zip(self.data_manager_list, state["sites"]):
+            dm.restore_state(site_state)
+
 
     def ensure_transaction_exists(self, trans_id):
         """
@@ -125,6 +369,15 @@ class TransactionManager:
             raise InvalidInputError("ERROR: Transaction {} does not exist".format(trans_id))
 
 
+    def ensure_variables_exist(self, var_ids):
+        """
+        raise an error for the first var_id(str) which is not a variable of the cluster
+        """
+        for var_id in var_ids:
+            if self.placement.var_number(var_id) is None:
+                raise InvalidInputError("ERROR: Variable {} does not exist".format(var_id))
+
+
     def add_read(self, trans_id, var_id):
         """ 
         Add a read operation to operation queue
@@ -146,6 +399,58 @@ class TransactionManager:
         self.operation_queue.append(Operation("W", trans_id, var_id, int(value)))
 
 
+    def variable_order(self, var_ids):
+        """
+        Return (tuple of var_id): var_ids without repeats, in the order locks are requested: x1, x2, ...
+        """
+        number = self.placement.var_number
+        return tuple(sorted(set(var_ids), key=lambda var_id: (number(var_id) or 0, var_id)))
+
+
+    def add_multi_read(self, trans_id, *var_ids):
+        """
+        Add a read of several variables to operation queue, their values come together once all are read
+        trans_id (str)
+        var_ids (str)
+        """
+        self.ensure_transaction_exists(trans_id)
+        self.ensure_variables_exist(var_ids)
+        self.operation_queue.append(Operation("MR", trans_id, self.variable_order(var_ids), {}))
+
+
+    def add_multi_write(self, trans_id, *args):
+        """
+        Add a write of several variables to operation queue, done once it holds every lock it needs
+        trans_id (str)
+        args (str): variable, value, variable, value, ...; the last value of a variable repeated wins
+        """
+        self.ensure_transaction_exists(trans_id)
+        self.ensure_variables_exist(args[::2])
+        values = {}
+        for var_id, value in zip(args[::2], args[1::2]):
+            values[var_id] = int(value)
+        var_ids = self.variable_order(values)
+        self.operation_queue.append(Operation("MW", trans_id, var_ids, tuple(values[var_id] for var_id in var_ids)))
+
+
+    def scan_range(self, low, high):
+        """
+        low (str), high (str): first and last variable of the range, like x3 and x9
+        Return (list of var_id): the variables of the cluster in the range
+        """
+        first, last = self.placement.var_number(low), self.placement.var_number(high)
+        if first is None or last is None or first > last:
+            raise InvalidInputError("ERROR: SCAN expects a range of variables, got {} to {}".format(low, high))
+        return ["x" + str(i) for i in range(first, last + 1)]
+
+
+    def add_scan(self, trans_id, low, high):
+        """
+        Add a read of every variable from low to high to operation queue
+        """
+        self.add_multi_read(trans_id, *self.scan_range(low, high))
+
+
     def begin(self, trans_id, read_only):
         """ 
         Begin a transaction with id trans_id
@@ -154,36 +459,147 @@ class TransactionManager:
         """
         if self.transaction_table.get(trans_id):
             raise InvalidInputError("ERROR: Transaction {} already exists".format(trans_id))
-        self.transaction_table[trans_id] = Transaction(trans_id, self.timestamp, read_only)
-        if not read_only:
-            print("Transaction {} begins".format(trans_id))
-        else:
-            print("Read-only transaction {} begins".format(trans_id))
+        trans = Transaction(trans_id, self.timestamp, read_only)
+        if read_only:
+            trans.snapshot = self.catalog.snapshot(self.timestamp)
+        self.transaction_table[trans_id] = trans
+        self.output.begin(trans_id, read_only)
 
 
     def read(self, operation: Operation):
         """ 
         Read a variable
         operation (Operation)
-        Return : (bool) whether read successfully
+        Return : (bool) whether read successfully, or the read-only transaction aborted as no copy ever will
         """
         self.ensure_transaction_exists(operation.trans_id)
-        for dm in self.data_manager_list:
-            if dm.is_working:
-                res, val = False, 0
-                if self.transaction_table[operation.trans_id].read_only:
-                    res, val = dm.read_snapshot(self.transaction_table[operation.trans_id].timestamp, operation.var_id)
-                    if res:
-                        print("Read-only transaction {} read from site {} ==> Result: {}: {}".format(operation.trans_id, dm.site_id, operation.var_id, val))
+        trans = self.transaction_table[operation.trans_id]
+        copy = self.read_copy(trans, operation.var_id)
+        if copy is None:
+            if trans.read_only and not self.may_serve_snapshot(trans, operation.var_id):
+                self.abort_read_only(trans, operation.var_id)
+                return True
+            return False
+        self.output.read(operation.trans_id, trans.read_only, copy[0], operation.var_id, copy[1])
+        return True
+
+
+    def read_replicas(self, trans_id, var_id):
+        """
+        Return (list of DataManager): the working copies of var_id in the order a read of trans_id tries them
+        """
+        return self.replica_selector.order(trans_id, var_id, self.catalog.up_replicas_of(var_id))
+
+
+    def read_copy(self, trans, var_id):
+        """
+        read var_id from the first working site that can serve it
+        trans (Transaction)
+        Return (site_id, value): None if no site can yet
+        """
+        if trans.read_only:
+            snapshot = trans.snapshot
+            copy = snapshot.cache.get(var_id)
+            if copy is not None and self.catalog.site_up[copy[0]]:
+                return copy
+            # the copy of a variable with no other copy missed no write
+            single = len(self.catalog.replicas_of(var_id)) == 1
+            for dm in self.read_replicas(trans.trans_id, var_id):
+                res, val = dm.read_snapshot(snapshot.timestamp, var_id, 0 if single else snapshot.up_since[dm.site_id])
+                if res:
+                    self.replica_selector.served(dm.site_id)
+                    snapshot.cache[var_id] = copy = (dm.site_id, val)
+                    return copy
+            return None
+        if self.optimistic:
+            copy = self.optimistic.read(trans.trans_id, var_id)
+            if copy is not None:
+                self.replica_selector.served(copy[0])
+            return copy
+        for dm in self.read_replicas(trans.trans_id, var_id):
+            res, val = dm.read(trans.trans_id, var_id)
+            if res:
+                # record the trans_id in case the site fails and the trans_id need to be aborted
+                dm.visited_transaction.add(trans.trans_id)
+                self.replica_selector.served(dm.site_id)
+                return dm.site_id, val
+        return None
+
+
+    def may_serve_snapshot(self, trans, var_id):
+        """
+        whether a copy may still serve var_id to the read-only transaction trans once the working ones refused it:
+        a copy whose site was up when trans began may recover with the version trans reads, as may the only copy
+        of a variable, the others missed commits
+        trans (Transaction)
+        """
+        replicas = self.catalog.replicas_of(var_id)
+        for dm in replicas:
+            if not self.catalog.site_up[dm.site_id]:
+                if trans.snapshot.up_since[dm.site_id] is not None or len(replicas) == 1:
+                    return True
+        return False
+
+
+    def abort_read_only(self, trans, var_id):
+        """
+        no copy can serve var_id to the read-only transaction trans, waiting would be forever
+        trans (Transaction)
+        """
+        if any(dm.has_discarded(trans.snapshot.timestamp, var_id) for dm in self.catalog.up_replicas_of(var_id)):
+            # not a failure, the copies kept too few versions
+            trans.abort_reason = "discarded version of {}".format(var_id)
+        else:
+            trans.abort_reason = "no copy of {} for its snapshot".format(var_id)
+        self.abort(trans.trans_id)
+
+
+    def read_many(self, operation: Operation):
+        """
+        Read the variables of a multi-read, a site is asked for all the variables it may serve at once
+        operation (Operation)
+        Return : (bool) whether every variable has been read, their values are then written in variable order
+        """
+        self.ensure_transaction_exists(operation.trans_id)
+        trans = self.transaction_table[operation.trans_id]
+        results = operation.value
+        if trans.read_only or self.optimistic:
+            for var_id in operation.var_id:
+                if var_id not in results:
+                    copy = self.read_copy(trans, var_id)
+                    if copy is not None:
+                        results[var_id] = copy
+                    elif trans.read_only and not self.may_serve_snapshot(trans, var_id):
+                        self.abort_read_only(trans, var_id)
                         return True
-                else:
-                    res, val = dm.read(operation.trans_id, operation.var_id)
-                    if res:
-                        # record the trans_id in case the site fails and the trans_id need to be aborted
+        else:
+            # a variable is asked to its first working copy, then to the next one if that site cannot grant its lock
+            candidates = {var_id: self.read_replicas(operation.trans_id, var_id)
+                          for var_id in operation.var_id if var_id not in results}
+            rank = 0
+            while candidates:
+                per_site = defaultdict(list)
+                for var_id, dms in candidates.items():
+                    if rank < len(dms):
+                        per_site[dms[rank].site_id].append(var_id)
+                if not per_site:
+                    break
+                for site_id in sorted(per_site):
+                    dm = self.data_manager_list[site_id - 1]
+                    read = dm.read_many(operation.trans_id, per_site[site_id])
+                    for var_id, val in read:
+                        results[var_id] = (site_id, val)
+                        del candidates[var_id]
+                        self.replica_selector.served(site_id)
+                    if read:
                         dm.visited_transaction.add(operation.trans_id)
-                        print("Transaction {} read from site {} ==> Result: {}: {}".format(operation.trans_id, dm.site_id, operation.var_id, val))
-                        return True
-        return False
+                rank += 1
+        if len(results) < len(operation.var_id):
+            return False
+        for var_id in operation.var_id:
+            site_id, val = results[var_id]
+            self.output.read(operation.trans_id, trans.read_only, site_id, var_id, val)
+        return True
 
 
     def write(self, operation: Operation):
@@ -193,15 +609,50 @@ class TransactionManager:
         Return : (bool) whether write successfully
         """
         self.ensure_transaction_exists(operation.trans_id)
-        for dm in self.data_manager_list:
-            if dm.is_working and not dm.check_write(operation.trans_id, operation.var_id):
+        if self.optimistic:
+            self.optimistic.write(operation.trans_id, operation.var_id, operation.value)
+            return True
+        replicas = self.catalog.up_replicas_of(operation.var_id)
+        for dm in replicas:
+            if not dm.check_write(operation.trans_id, operation.var_id):
                 return False
         
         sites = []
-        for dm in self.data_manager_list:
-            if dm.is_working and dm.write(operation.trans_id, operation.var_id, operation.value):
+        for dm in replicas:
+            if dm.write(operation.trans_id, operation.var_id, operation.value):
                 sites.append(dm.site_id)                
-        print("Transaction {} write value {} to {} in sites {}".format(operation.trans_id, operation.value, operation.var_id, sites))
+        self.output.write(operation.trans_id, operation.var_id, operation.value, sites)
+        return True
+
+
+    def write_many(self, operation: Operation):
+        """
+        Write the variables of a multi-write once every working copy of each granted its lock,
+        the locks are requested at each site at once, in variable order
+        operation (Operation)
+        Return : (bool) whether the variables were written
+        """
+        self.ensure_transaction_exists(operation.trans_id)
+        if self.optimistic:
+            for var_id, value in zip(operation.var_id, operation.value):
+                self.optimistic.write(operation.trans_id, var_id, value)
+            return True
+        per_site = defaultdict(list)
+        for var_id in operation.var_id:
+            for dm in self.catalog.up_replicas_of(var_id):
+                per_site[dm.site_id].append(var_id)
+        granted = True
+        for site_id in sorted(per_site):
+            if not self.data_manager_list[site_id - 1].check_write_many(operation.trans_id, per_site[site_id]):
+                granted = False
+        if not granted:
+            return False
+        for var_id, value in zip(operation.var_id, operation.value):
+            sites = []
+            for dm in self.catalog.up_replicas_of(var_id):
+                if dm.write(operation.trans_id, var_id, value):
+                    sites.append(dm.site_id)
+            self.output.write(operation.trans_id, var_id, value, sites)
         return True
 
 
@@ -210,9 +661,24 @@ class TransactionManager:
         gives the commited values of all copies of all variables at all sites
         sorted per site with all values in ascending order by variable name
         """
-        print("Dumping...")
-        for dm in self.data_manager_list:
-            dm.dump()
+        self.output.dump_start()
+        if self.site_pool:
+            values = self.site_pool.map(DataManager.dump_values, self.data_manager_list)
+            for dm, dm_values in zip(self.data_manager_list, values):
+                self.output.dump_site(dm.site_id, dm.is_working, dm_values)
+        else:
+            for dm in self.data_manager_list:
+                dm.dump()
+
+
+    def stats(self):
+        """
+        write the counters and timers collected so far
+        """
+        if self.metrics:
+            self.output.stats(self.metrics.snapshot(self))
+        else:
+            self.output.message("Stats are not collected, run with --metrics")
 
 
     def end(self, trans_id):
@@ -231,9 +697,11 @@ class TransactionManager:
         """
         abort a transaction
         """
-        for dm in self.data_manager_list:
-            dm.abort(trans_id)
-        print("Transaction {} is aborted because of {}".format(trans_id, self.transaction_table[trans_id].abort_reason))
+        self.run_on_sites(self.sites_locked_by(trans_id), lambda dm: dm.abort(trans_id))
+        if self.optimistic:
+            self.optimistic.forget(trans_id)
+        self.operation_queue.remove_transaction(trans_id)
+        self.output.abort(trans_id, self.transaction_table[trans_id].abort_reason)
         self.transaction_table.pop(trans_id)
 
 
@@ -241,22 +709,58 @@ class TransactionManager:
         """
         commit a transaction
         """
-        for dm in self.data_manager_list:
-            dm.commit(trans_id, self.timestamp)
+        for seq in self.operation_queue.transaction_operations.get(trans_id, ()):
+            for var_id in self.operation_queue.operations[seq].variables():
+                if any(dm.waits_for_lock(trans_id, var_id) for dm in self.data_manager_list):
+                    raise InvalidInputError("ERROR: transaction {} commits before all operations done".format(trans_id))
+        timestamp = self.timestamp
+        if self.optimistic:
+            if not self.optimistic.validate(trans_id):
+                self.transaction_table[trans_id].abort_reason = "validation failure"
+                self.abort(trans_id)
+                return
+            self.optimistic.commit(trans_id, timestamp)
+        self.run_on_sites(self.sites_locked_by(trans_id), lambda dm: dm.commit(trans_id, timestamp))
+        if not self.async_commit:
+            # the logs of all sites sync their groups at the same time, the commit waits for one window
+            for dm in self.data_manager_list:
+                if dm.wal:
+                    dm.wal.wait_synced()
+        self.operation_queue.remove_transaction(trans_id)
         self.transaction_table.pop(trans_id)
-        print("Transaction {} commits at time {}".format(trans_id, self.timestamp))
+        self.output.commit(trans_id, self.timestamp)
+
+
+    def sites_locked_by(self, trans_id):
+        """
+        Return (list of DataManager): the sites where trans_id holds or waits for a lock, the others have nothing to release
+        """
+        return [dm for dm in self.data_manager_list if trans_id in dm.transaction_locks]
+
+
+    def run_on_sites(self, dms, func):
+        """
+        call func(dm) for every site of dms, in parallel with site_workers
+        """
+        if self.site_pool:
+            self.site_pool.map(func, dms)
+        else:
+            for dm in dms:
+                func(dm)
 
 
     def fail(self, site_id: int):
         """ 
         site with id stie_id (int) fails
         """
-        if site_id < 1 or site_id > 10:
+        if site_id < 1 or site_id > len(self.data_manager_list):
             raise InvalidInputError("ERROR: site {} does not exist".format(site_id))
         if not self.data_manager_list[site_id - 1].is_working:
             raise InvalidInputError("ERROR: site {} already fails".format(site_id))
         dm: DataManager = self.data_manager_list[site_id - 1]
         dm.fail()
+        self.catalog.set_site_status(site_id, False, self.timestamp)
+        self.operation_queue.wake_site(dm)
         # if a transaction visited this site and haven't commited yet, abort it
 
         for trans_id in dm.visited_transaction:
@@ -269,41 +773,41 @@ class TransactionManager:
         """ 
         recover site
         """
-        if site_id < 1 or site_id > 10:
+        if site_id < 1 or site_id > len(self.data_manager_list):
             raise InvalidInputError("ERROR: site {} does not exist".format(site_id))
         if self.data_manager_list[site_id - 1].is_working:
             raise InvalidInputError("ERROR: site {} already works".format(site_id))
         dm: DataManager = self.data_manager_list[site_id - 1]
         dm.recover()
+        self.catalog.set_site_status(site_id, True, self.timestamp)
+        if self.catch_up == "bulk":
+            dm.catch_up_all()
+        self.operation_queue.wake_site(dm)
+
+
+    def resolve_deadlocks(self):
+        """
+        abort victims until no cycle is left, a script only aborts one per command as the next command
+        will come, a server may have every client waiting
+        """
+        while self.deadlock_policy.resolve():
+            pass
+
 
     def deadlock_detect(self):
-        lock_graph = defaultdict(set)
-        for data_manager in self.data_manager_list:
-            if data_manager.is_working:
-                graph = data_manager.generate_graph()
-                for node,adj_list in graph.items():
-                    lock_graph[node].update(adj_list)
+        """
+        abort the youngest transaction lying on a cycle of the wait-for graph
+        Return (bool): whether a transaction is aborted
+        """
         abort_trans_id = None
         earliest_ts = -10000
-        for node in list(lock_graph.keys()):
-            visited = set()
-            if dfs(node,node,visited,lock_graph):
-                if self.transaction_table[node].timestamp > earliest_ts:
-                    abort_trans_id = node
-                    earliest_ts = self.transaction_table[node].timestamp
+        for node in self.wait_for_graph.cycle_nodes():
+            if self.transaction_table[node].timestamp > earliest_ts:
+                abort_trans_id = node
+                earliest_ts = self.transaction_table[node].timestamp
         if abort_trans_id:
-            print("Deadlock exists: transaction {} is aborted".format(abort_trans_id))
+            self.output.deadlock(abort_trans_id)
             self.transaction_table[abort_trans_id].abort_reason = "deadlock"
             self.abort(abort_trans_id)
             return True
         return False
-        
-def dfs(cur,root,visited,graph):
-    visited.add(cur)
-    for neighbour in graph[cur]:
-        if neighbour == root:
-            return True
-        if neighbour not in visited:
-            if dfs(neighbour,root,visited,graph):
-                return True
-    return False
\ No newline at end of file
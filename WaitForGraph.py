@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+
+class WaitForGraph:
+    STATE = ("edges", "edge_count", "graph", "reverse_graph", "dirty")
+
+    def __init__(self):
+        """
+        edges (dict -- (site_id, var_id) : set of (waiter, holder)): edges contributed by each lock manager
+        edge_count (dict -- (waiter, holder) : int): number of lock managers contributing an edge
+        graph (dict -- trans_id : set of trans_id): waiter -> transactions it waits for
+        reverse_graph (dict -- trans_id : set of trans_id): holder -> transactions waiting for it
+        dirty (set of trans_id): waiters whose edges were added since the graph was last known acyclic,
+            every cycle in the graph goes through one of them
+        """
+        self.edges = {}
+        self.edge_count = defaultdict(int)
+        self.graph = defaultdict(set)
+        self.reverse_graph = defaultdict(set)
+        self.dirty = set()
+
+
+    def update_lock(self, site_id, var_id, lock_manager):
+        """
+        refresh the edges contributed by the lock manager of var_id at site_id
+        site_id (int)
+        var_id (str)
+        lock_manager (LockManager)
+        """
+        key = (site_id, var_id)
+        old_edges = self.edges.get(key, set())
+        new_edges = lock_manager.wait_for_edges()
+        if new_edges == old_edges:
+            return
+        for edge in old_edges - new_edges:
+            self.remove_edge(edge)
+        for edge in new_edges - old_edges:
+            self.add_edge(edge)
+        if new_edges:
+            self.edges[key] = new_edges
+        else:
+            self.edges.pop(key, None)
+
+
+    def add_edge(self, edge):
+        waiter, holder = edge
+        self.edge_count[edge] += 1
+        if self.edge_count[edge] == 1:
+            self.graph[waiter].add(holder)
+            self.reverse_graph[holder].add(waiter)
+            self.dirty.add(waiter)
+
+
+    def remove_edge(self, edge):
+        waiter, holder = edge
+        self.edge_count[edge] -= 1
+        if not self.edge_count[edge]:
+            del self.edge_count[edge]
+            self.graph[waiter].discard(holder)
+            if not self.graph[waiter]:
+                del self.graph[waiter]
+            self.reverse_graph[holder].discard(waiter)
+            if not self.reverse_graph[holder]:
+                del self.reverse_graph[holder]
+
+
+    def cycle_nodes(self):
+        """
+        find every transaction lying on a cycle, only searching from the dirty transactions
+        the dirty set is replaced by the result, so cycles left unresolved are searched again next time
+        Return (set of trans_id)
+        """
+        nodes = set()
+        for trans_id in self.dirty:
+            if trans_id in nodes:
+                continue
+            # transactions on a cycle through trans_id are both reachable from it and reaching it
+            forward = reachable(trans_id, self.graph)
+            if trans_id in forward:
+                nodes |= forward & reachable(trans_id, self.reverse_graph)
+        self.dirty = set(nodes)
+        return nodes
+
+
+def reachable(root, graph):
+    """
+    transactions reachable from root through at least one edge
+    """
+    visited = set()
+    stack = [root]
+    while stack:
+        cur = stack.pop()
+        for neighbour in graph.get(cur, ()):
+            if neighbour not in visited:
+                visited.add(neighbour)
+                stack.append(neighbour)
+    return visited
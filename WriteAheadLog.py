@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from Checkpoint import CheckpointFile, write_checkpoint
+
+
+class WriteAheadLog:
+    def __init__(self, directory, site_id, group_commit_ms=5, checkpoint_interval=1000, restore=False):
+        """
+        durable storage of the committed writes of a site: a checkpoint plus the commits logged after it
+        directory (str): where site<id>.wal and site<id>.ckpt live
+        group_commit_ms (float): commits within this window share one fsync, 0 to fsync every commit
+        checkpoint_interval (int): commits logged between two checkpoints
+        restore (bool): keep the files of a previous run instead of discarding them
+        pending (int): commits written but not yet fsynced
+        written, synced (int): commits written since the start, and how many of them are on disk
+        timer (threading.Timer): fsyncs the pending commits when their window ends, if no commit does it before
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, "site{}.wal".format(site_id))
+        self.checkpoint_path = os.path.join(directory, "site{}.ckpt".format(site_id))
+        self.group_commit = group_commit_ms / 1000
+        self.checkpoint_interval = checkpoint_interval
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if not restore:
+            flags |= os.O_TRUNC
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+        self.fd = os.open(self.log_path, flags, 0o644)
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.written = 0
+        self.synced = 0
+        self.timer = None
+        self.lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+        self.logged_since_checkpoint = 0
+        self.stats = {"commits": 0, "fsyncs": 0, "checkpoints": 0}
+
+
+    def log_commit(self, timestamp, writes):
+        """
+        append a commit record, it reaches the OS right away and the disk with the fsync of its group, at
+        the latest group_commit after the previous fsync
+        timestamp (int)
+        writes (list of (var_id, value))
+        """
+        record = " ".join(["C", str(timestamp)] + ["{}={}".format(var_id, value) for var_id, value in writes])
+        with self.lock:
+            os.write(self.fd, (record + "\n").encode())
+            self.pending += 1
+            self.written += 1
+            self.logged_since_checkpoint += 1
+            self.stats["commits"] += 1
+            wait = self.last_sync + self.group_commit - time.monotonic()
+            if wait <= 0:
+                self.sync_pending()
+            elif not self.timer:
+                # the group is synced when its window ends, even if no other commit comes
+                self.timer = threading.Timer(wait, self.sync)
+                self.timer.daemon = True
+                self.timer.start()
+
+
+    def sync(self):
+        """
+        fsync the commits written since the last fsync
+        """
+        with self.lock:
+            self.sync_pending()
+
+
+    def sync_pending(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending:
+            os.fsync(self.fd)
+            self.stats["fsyncs"] += 1
+            self.pending = 0
+        self.last_sync = time.monotonic()
+        self.synced = self.written
+        self.flushed.notify_all()
+
+
+    def wait_synced(self):
+        """
+        block until the commits logged so far are on disk, which takes until the end of their group's window
+        """
+        with self.lock:
+            target = self.written
+            while self.synced < target:
+                self.flushed.wait()
+
+
+    def should_checkpoint(self):
+        return self.logged_since_checkpoint >= self.checkpoint_interval
+
+
+    def checkpoint(self, has_failed, timestamp, records):
+        """
+        replace the checkpoint, then empty the log it now covers
+        has_failed (bool): the site failed before
+        timestamp (int): last commit logged
+        records (iterable of CheckpointRecord): every committed variable, sorted by var_number
+        """
+        write_checkpoint(self.checkpoint_path, has_failed, timestamp, records)
+        with self.lock:
+            os.ftruncate(self.fd, 0)
+            self.pending = 0
+            # the checkpoint was fsynced with every commit logged before it
+            self.synced = self.written
+            self.flushed.notify_all()
+            self.logged_since_checkpoint = 0
+        self.stats["checkpoints"] += 1
+
+
+    def open_checkpoint(self):
+        """
+        Return (CheckpointFile): None if no checkpoint was written yet
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        return CheckpointFile(self.checkpoint_path)
+
+
+    def read_log(self):
+        """
+        Return (list of (timestamp, var_id, value)): commits logged after the checkpoint, in order
+        """
+        records = []
+        with open(self.log_path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # torn write at the end of the log
+                    break
+                _, timestamp, *writes = line.split()
+                for write in writes:
+                    var_id, value = write.split("=")
+                    records.append((int(timestamp), var_id, int(value)))
+        return records
+
+
+    def close(self):
+        self.sync()
+        os.close(self.fd)
@@ -0,0 +1,68 @@
+"""
+Reading many keys with one R command per key against one MR command per transaction
+
+    $ python3 benchmark/batch.py --keys 1 10 50 --transactions 2000
+
+Each transaction reads --keys random variables then ends, --concurrency of them run at once. The
+transactions share their read locks and never wait, what is measured is the work of each command.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Placement import DefaultPlacement
+from Output import NullSink
+
+
+def script(keys, transactions, variables, concurrency, batched, seed=0):
+    """
+    Return (list of str): begins, reads and ends of the transactions, interleaved by rounds of concurrency
+    """
+    rand = random.Random(seed)
+    lines = []
+    for first in range(0, transactions, concurrency):
+        group = ["T" + str(k) for k in range(first, min(first + concurrency, transactions))]
+        reads = {trans_id: rand.sample(range(1, variables + 1), keys) for trans_id in group}
+        lines.extend("begin({})".format(trans_id) for trans_id in group)
+        for trans_id in group:
+            if batched:
+                lines.append("MR({},{})".format(trans_id, ",".join("x" + str(i) for i in reads[trans_id])))
+            else:
+                lines.extend("R({},x{})".format(trans_id, i) for i in reads[trans_id])
+        for trans_id in group:
+            lines.append("end({})".format(trans_id))
+    return lines
+
+
+def run(lines, sites, variables):
+    tm = TransactionManager(DefaultPlacement(sites, variables), output=NullSink())
+    start = time.perf_counter()
+    for line in lines:
+        tm.get_command(line)
+    elapsed = time.perf_counter() - start
+    tm.close()
+    return elapsed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Keys read per second with R commands and with MR commands")
+    arg_parser.add_argument("--keys", type=int, nargs="+", default=[1, 10, 50])
+    arg_parser.add_argument("--transactions", type=int, default=2000)
+    arg_parser.add_argument("--sites", type=int, default=10)
+    arg_parser.add_argument("--variables", type=int, default=1000)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    args = arg_parser.parse_args()
+
+    print("{:>6}{:>16}{:>16}{:>10}".format("keys", "R keys/sec", "MR keys/sec", "speedup"))
+    for keys in args.keys:
+        times = []
+        for batched in (False, True):
+            lines = script(keys, args.transactions, args.variables, args.concurrency, batched)
+            times.append(run(lines, args.sites, args.variables))
+        total = keys * args.transactions
+        print("{:>6}{:>16.0f}{:>16.0f}{:>9.1f}x".format(keys, total / times[0], total / times[1], times[0] / times[1]))
@@ -0,0 +1,58 @@
+"""
+How long recovered sites stay degraded with each catch-up mode, on a workload with site failures
+
+    $ python3 benchmark/catchup.py --transactions 3000 --failure-rate 0.01
+    $ python3 benchmark/catchup.py --variables 200 --read-ratio 0.9
+
+A recovered site is degraded until it can read all its replicated copies again. Without catch-up a
+copy has to be written first, lazy catch-up copies it from a peer on its first read, bulk catch-up
+copies every copy it can when the site recovers.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import CountingSink
+from workload import add_workload_arguments, make_transaction_manager, workload_from_args
+
+
+def run(workload, catch_up):
+    """
+    Return (dict): outcome, recoveries and ticks the recovered sites stayed degraded, commands per second
+    """
+    sink = CountingSink()
+    tm = make_transaction_manager(workload, sink, metrics=True, catch_up=catch_up)
+    commands = 0
+    start = time.perf_counter()
+    for line in workload.commands(tm):
+        tm.get_command(line)
+        commands += 1
+    elapsed = time.perf_counter() - start
+    degraded = tm.metrics.snapshot(tm)["degraded"].values()
+    tm.close()
+    recoveries = sum(site["recoveries"] for site in degraded)
+    return {
+        "commits": sink.commits,
+        "aborts": sink.aborts,
+        "recoveries": recoveries,
+        "degraded_ticks": round(sum(site["ticks"] for site in degraded) / max(1, recoveries), 1),
+        "commands_per_sec": round(commands / elapsed),
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Compare the catch-up modes of recovered sites")
+    add_workload_arguments(arg_parser)
+    arg_parser.set_defaults(transactions=3000, failure_rate=0.01)
+    args = arg_parser.parse_args()
+    workload = workload_from_args(args)
+
+    print("{:<8}{:>9}{:>8}{:>12}{:>22}{:>14}".format(
+        "mode", "commits", "aborts", "recoveries", "degraded per recovery", "commands/sec"))
+    for catch_up in ("off", "lazy", "bulk"):
+        result = run(workload, catch_up)
+        print("{:<8}{commits:>9}{aborts:>8}{recoveries:>12}{degraded_ticks:>22}{commands_per_sec:>14}".format(
+            catch_up, **result))
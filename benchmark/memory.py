@@ -0,0 +1,74 @@
+"""
+Memory footprint of variables and in-flight transactions
+
+    $ python3 benchmark/memory.py --sites 10 --variables 100000 --transactions 10000
+
+Bytes per variable copy: every copy at every site is built, with its version chain and lock manager.
+Bytes per in-flight transaction: each transaction reads one variable and writes another one,
+and keeps its locks, operations and bookkeeping until the measurement ends.
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Placement import PLACEMENTS, make_placement
+from Output import NullSink
+
+
+def build_all_variables(tm, placement):
+    copies = 0
+    for dm in tm.data_manager_list:
+        for i in placement.variables_at(dm.site_id):
+            dm.get_variable("x" + str(i))
+            copies += 1
+    return copies
+
+
+def bytes_per_variable(placement):
+    tm = TransactionManager(placement, output=NullSink())
+    for dm in tm.data_manager_list:
+        placement.variables_at(dm.site_id)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copies = build_all_variables(tm, placement)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / copies
+
+
+def bytes_per_transaction(placement, transactions):
+    tm = TransactionManager(placement, output=NullSink())
+    build_all_variables(tm, placement)
+    lines = []
+    for k in range(transactions):
+        trans_id = "T" + str(k)
+        lines.append("begin({})".format(trans_id))
+        lines.append("R({},x{})".format(trans_id, 2 * k % placement.num_variables + 1))
+        lines.append("W({},x{},{})".format(trans_id, (2 * k + 1) % placement.num_variables + 1, k))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for line in lines:
+        tm.get_command(line)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / transactions
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Memory footprint per variable copy and per in-flight transaction")
+    arg_parser.add_argument("--sites", type=int, default=10)
+    arg_parser.add_argument("--variables", type=int, default=20000)
+    arg_parser.add_argument("--placement", choices=sorted(PLACEMENTS), default="default")
+    arg_parser.add_argument("--replication", type=int, default=1)
+    arg_parser.add_argument("--transactions", type=int, default=5000,
+                            help="in-flight transactions, at most half the number of variables to avoid conflicts")
+    args = arg_parser.parse_args()
+
+    placement = make_placement(args.placement, args.sites, args.variables, args.replication)
+    print("bytes per variable copy:      {:.1f}".format(bytes_per_variable(placement)))
+    placement = make_placement(args.placement, args.sites, args.variables, args.replication)
+    print("bytes per in-flight transaction: {:.1f}".format(bytes_per_transaction(placement, args.transactions)))
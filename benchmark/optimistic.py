@@ -0,0 +1,35 @@
+"""
+Locking against optimistic concurrency control on the scenarios of suite.py
+
+    $ python3 benchmark/optimistic.py                    # every scenario
+    $ python3 benchmark/optimistic.py read_heavy uniform
+
+Under locking a transaction waits for the locks it needs and deadlocks are detected; under optimistic
+control nothing waits, a transaction whose reads were overwritten before it ends is aborted instead.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import SCENARIOS, run_scenario
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Compare locking and optimistic concurrency control")
+    arg_parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                            help="among {} (default: all)".format(", ".join(SCENARIOS)))
+    args = arg_parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            arg_parser.error("unknown scenario {}".format(name))
+
+    print("{:<12}{:<12}{:>9}{:>9}{:>8}{:>12}{:>14}{:>10}{:>10}".format(
+        "scenario", "control", "commands", "commits", "aborts", "abort rate", "commands/sec", "p50 us", "p99 us"))
+    for name in args.scenarios or SCENARIOS:
+        for control in ("locking", "optimistic"):
+            result = run_scenario(SCENARIOS[name], concurrency_control=control)
+            rate = result["aborts"] / max(1, result["commits"] + result["aborts"])
+            print("{:<12}{:<12}{commands:>9}{commits:>9}{aborts:>8}{:>12.1%}{commands_per_sec:>14}{p50_us:>10}{p99_us:>10}".format(
+                name, control, rate, **result))
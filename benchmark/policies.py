@@ -0,0 +1,39 @@
+"""
+Throughput and abort rate of each deadlock policy on the scenarios of suite.py
+
+    $ python3 benchmark/policies.py                      # every scenario
+    $ python3 benchmark/policies.py hotspot --lock-timeout 5
+
+Detection lets transactions wait and aborts one when a cycle forms, the other policies abort some
+transactions before they wait so that no cycle can form. The abort rate counts every aborted
+transaction, whatever the reason, over the transactions that ended either way.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DeadlockPolicy import POLICIES
+from suite import SCENARIOS, run_scenario
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Compare the deadlock policies on the benchmark scenarios")
+    arg_parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                            help="among {} (default: all)".format(", ".join(SCENARIOS)))
+    arg_parser.add_argument("--lock-timeout", type=int, default=0,
+                            help="commands the no-wait policy lets a transaction wait (default: 0)")
+    args = arg_parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            arg_parser.error("unknown scenario {}".format(name))
+
+    print("{:<12}{:<12}{:>9}{:>9}{:>8}{:>12}{:>14}{:>10}".format(
+        "scenario", "policy", "commands", "commits", "aborts", "abort rate", "commands/sec", "p99 us"))
+    for name in args.scenarios or SCENARIOS:
+        for policy in POLICIES:
+            result = run_scenario(SCENARIOS[name], deadlock_policy=policy, lock_timeout=args.lock_timeout)
+            rate = result["aborts"] / max(1, result["commits"] + result["aborts"])
+            print("{:<12}{:<12}{commands:>9}{commits:>9}{aborts:>8}{:>12.1%}{commands_per_sec:>14}{p99_us:>10}".format(
+                name, policy, rate, **result))
@@ -0,0 +1,62 @@
+"""
+How reads spread over the sites with each replica selection, on the scenarios of suite.py
+
+    $ python3 benchmark/replicas.py                    # every scenario
+    $ python3 benchmark/replicas.py read_heavy large
+
+The skew is the reads served by the busiest site over the mean reads per site, 1.0 when the reads are
+spread evenly; the busiest column is that site.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReplicaSelection import SELECTORS
+from suite import SCENARIOS, CountingSink
+from workload import Workload, make_transaction_manager
+
+
+def run(knobs, replica_selection):
+    """
+    Return (dict): outcome, read skew over the sites and commands per second
+    """
+    workload = Workload(**knobs)
+    sink = CountingSink()
+    tm = make_transaction_manager(workload, sink, replica_selection=replica_selection)
+    commands = 0
+    start = time.perf_counter()
+    for line in workload.commands(tm):
+        tm.get_command(line)
+        commands += 1
+    elapsed = time.perf_counter() - start
+    tm.close()
+    reads = tm.replica_selector.reads
+    busiest = max(reads, key=reads.get)
+    return {
+        "commits": sink.commits,
+        "aborts": sink.aborts,
+        "skew": reads[busiest] / (sum(reads.values()) / workload.sites),
+        "busiest": busiest,
+        "commands_per_sec": round(commands / elapsed),
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Compare the replica selections on the benchmark scenarios")
+    arg_parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                            help="among {} (default: all)".format(", ".join(SCENARIOS)))
+    args = arg_parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            arg_parser.error("unknown scenario {}".format(name))
+
+    print("{:<12}{:<14}{:>9}{:>8}{:>8}{:>9}{:>14}".format(
+        "scenario", "selection", "commits", "aborts", "skew", "busiest", "commands/sec"))
+    for name in args.scenarios or SCENARIOS:
+        for selection in SELECTORS:
+            result = run(SCENARIOS[name], selection)
+            print("{:<12}{:<14}{commits:>9}{aborts:>8}{skew:>8.2f}{busiest:>9}{commands_per_sec:>14}".format(
+                name, selection, **result))
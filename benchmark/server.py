@@ -0,0 +1,94 @@
+"""
+Commands per second one server process sustains with many concurrent client sessions
+
+    $ python3 benchmark/server.py --sessions 1 10 100 500 --seconds 5
+
+The server and its clients run in the same event loop over a Unix socket. Each client runs transactions
+of --operations reads and writes on random variables one command at a time, and begins a new
+transaction when its transaction commits or is aborted.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Placement import DefaultPlacement
+from Server import Server
+
+
+async def client(path, k, operations, variables, deadline, counts):
+    reader, writer = await asyncio.open_unix_connection(path)
+    rand = random.Random(k)
+
+    async def send(line):
+        writer.write((line + "\n").encode())
+        await writer.drain()
+        lines = []
+        while True:
+            line = (await reader.readline()).decode().rstrip("\n")
+            if not line:
+                break
+            lines.append(line)
+        counts["commands"] += 1
+        return lines
+
+    n = 0
+    while time.perf_counter() < deadline:
+        trans_id = "T{}_{}".format(k, n)
+        n += 1
+        await send("begin({})".format(trans_id))
+        aborted = False
+        for _ in range(operations):
+            var_id = "x{}".format(rand.randint(1, variables))
+            if rand.random() < 0.5:
+                lines = await send("R({},{})".format(trans_id, var_id))
+            else:
+                lines = await send("W({},{},{})".format(trans_id, var_id, rand.randint(1, 999)))
+            if any("aborted" in line for line in lines):
+                aborted = True
+                break
+        if aborted:
+            counts["aborts"] += 1
+            continue
+        lines = await send("end({})".format(trans_id))
+        counts["commits" if any("commits" in line for line in lines) else "aborts"] += 1
+    writer.close()
+
+
+async def measure(sessions, seconds, sites, variables, operations):
+    path = os.path.join(tempfile.mkdtemp(), "server.sock")
+    tm = TransactionManager(DefaultPlacement(sites, variables))
+    server = Server(tm)
+    listener = await server.start("unix:" + path)
+    counts = {"commands": 0, "commits": 0, "aborts": 0}
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*[client(path, k, operations, variables, deadline, counts) for k in range(sessions)])
+    elapsed = time.perf_counter() - start
+    while server.sessions:
+        # let the server see the clients leave
+        await asyncio.sleep(0.01)
+    listener.close()
+    os.remove(path)
+    return counts, elapsed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Server throughput per number of concurrent sessions")
+    arg_parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100, 500])
+    arg_parser.add_argument("--seconds", type=float, default=5)
+    arg_parser.add_argument("--sites", type=int, default=10)
+    arg_parser.add_argument("--variables", type=int, default=1000)
+    arg_parser.add_argument("--operations", type=int, default=4)
+    args = arg_parser.parse_args()
+
+    print("{:>9}{:>14}{:>10}{:>10}".format("sessions", "commands/sec", "commits", "aborts"))
+    for sessions in args.sessions:
+        counts, elapsed = asyncio.run(measure(sessions, args.seconds, args.sites, args.variables, args.operations))
+        print("{:>9}{:>14.0f}{:>10}{:>10}".format(sessions, counts["commands"] / elapsed, counts["commits"], counts["aborts"]))
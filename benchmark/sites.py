@@ -0,0 +1,65 @@
+"""
+Throughput of committing the sites in turn or with a pool of threads, as the number of sites grows
+
+    $ python3 benchmark/sites.py --sites 5 10 20 40 --workers 4 16
+
+Every site logs its commits with --group-commit-ms 0, so each commit fsyncs at every site it wrote to:
+that is the work threads overlap. "memory" runs without a log, where the fan-out is pure Python.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Placement import DefaultPlacement
+from Output import NullSink
+from workload import Workload
+
+
+def run(lines, sites, variables, workers, wal_dir):
+    tm = TransactionManager(DefaultPlacement(sites, variables), wal_dir=wal_dir, group_commit_ms=0,
+                            output=NullSink(), site_workers=workers)
+    start = time.perf_counter()
+    for line in lines:
+        tm.get_command(line)
+    tm.close()
+    return len(lines) / (time.perf_counter() - start)
+
+
+def script(workload, sites, variables):
+    # the script is the same whatever the pool, write it once
+    tm = TransactionManager(DefaultPlacement(sites, variables), output=NullSink())
+    lines = []
+    for line in workload.commands(tm):
+        tm.get_command(line)
+        lines.append(line)
+    return lines
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Commands per second per number of sites and of site workers")
+    arg_parser.add_argument("--sites", type=int, nargs="+", default=[5, 10, 20, 40])
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[4, 16])
+    arg_parser.add_argument("--transactions", type=int, default=300)
+    args = arg_parser.parse_args()
+
+    print("{:>6} {:>8}{:>12}".format("sites", "log", "serial") + "".join("{:>12}".format("{} workers".format(w)) for w in args.workers))
+    for sites in args.sites:
+        variables = 2 * sites
+        workload = Workload(transactions=args.transactions, sites=sites, variables=variables, read_ratio=0.3)
+        lines = script(workload, sites, variables)
+        for logged in (False, True):
+            row = []
+            for workers in [0] + args.workers:
+                wal_dir = tempfile.mkdtemp() if logged else None
+                try:
+                    row.append(run(lines, sites, variables, workers, wal_dir))
+                finally:
+                    if wal_dir:
+                        shutil.rmtree(wal_dir)
+            print("{:>6} {:>8}".format(sites, "fsync" if logged else "memory") + "".join("{:>12.0f}".format(r) for r in row))
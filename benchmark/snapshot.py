@@ -0,0 +1,72 @@
+"""
+Reads of read-only transactions, each variable read once against the same variables read again and again
+
+    $ python3 benchmark/snapshot.py --keys 50 --repeats 1 10 --transactions 500
+
+Each read-only transaction reads --keys random variables --repeats times then ends, with site failures
+and recoveries between transactions so that some copies cannot serve the snapshot. Read-write
+transactions commit a write to every variable first so that every copy has a few versions.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Placement import DefaultPlacement
+from Output import NullSink
+
+
+def script(keys, repeats, transactions, sites, variables, seed=0):
+    """
+    Return (list of str), int: the commands and how many of them are reads of read-only transactions
+    """
+    rand = random.Random(seed)
+    lines = []
+    for k in range(3):
+        trans_id = "W" + str(k)
+        lines.append("begin({})".format(trans_id))
+        lines.extend("W({},x{},{})".format(trans_id, i, k) for i in range(1, variables + 1))
+        lines.append("end({})".format(trans_id))
+    reads = 0
+    for k in range(transactions):
+        trans_id = "T" + str(k)
+        site_id = rand.randint(1, sites)
+        lines.append("fail({})".format(site_id))
+        lines.append("beginRO({})".format(trans_id))
+        lines.append("recover({})".format(site_id))
+        chosen = rand.sample(range(1, variables + 1), keys)
+        for _ in range(repeats):
+            lines.extend("R({},x{})".format(trans_id, i) for i in chosen)
+        reads += keys * repeats
+        lines.append("end({})".format(trans_id))
+    return lines, reads
+
+
+def run(lines, sites, variables):
+    tm = TransactionManager(DefaultPlacement(sites, variables), output=NullSink())
+    start = time.perf_counter()
+    for line in lines:
+        tm.get_command(line)
+    elapsed = time.perf_counter() - start
+    tm.close()
+    return elapsed
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Reads per second of read-only transactions")
+    arg_parser.add_argument("--keys", type=int, default=50)
+    arg_parser.add_argument("--repeats", type=int, nargs="+", default=[1, 10])
+    arg_parser.add_argument("--transactions", type=int, default=500)
+    arg_parser.add_argument("--sites", type=int, default=10)
+    arg_parser.add_argument("--variables", type=int, default=1000)
+    args = arg_parser.parse_args()
+
+    print("{:>8}{:>10}{:>14}".format("repeats", "reads", "reads/sec"))
+    for repeats in args.repeats:
+        lines, reads = script(args.keys, repeats, args.transactions, args.sites, args.variables)
+        elapsed = run(lines, args.sites, args.variables)
+        print("{:>8}{:>10}{:>14.0f}".format(repeats, reads, reads / elapsed))
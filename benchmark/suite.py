@@ -0,0 +1,141 @@
+"""
+Throughput, latency and outcome of synthetic workloads, compared with a stored baseline
+
+    $ python3 benchmark/suite.py                    # run every scenario and compare with baseline.json
+    $ python3 benchmark/suite.py hotspot failures   # only some scenarios
+    $ python3 benchmark/suite.py --save-baseline    # record the current numbers as the baseline
+
+Each scenario drives TransactionManager.get_command with a script from workload.py. Commits, aborts,
+deadlocks and the number of commands are deterministic, a difference with the baseline means the
+behavior changed. Throughput and latency depend on the machine, they are reported as regressions
+when they are worse than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Output import Sink
+from workload import Workload, make_transaction_manager
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SCENARIOS = {
+    "uniform": dict(transactions=3000),
+    "read_heavy": dict(transactions=3000, read_ratio=0.9, read_only_fraction=0.3),
+    "hotspot": dict(transactions=3000, zipf=1.2, concurrency=16),
+    "failures": dict(transactions=3000, failure_rate=0.01),
+    "large": dict(transactions=3000, sites=20, variables=2000, zipf=0.8, concurrency=32, operations=8),
+}
+
+# outcome of a run, must match the baseline exactly
+OUTCOME = ("commands", "commits", "aborts", "deadlocks")
+
+
+class CountingSink(Sink):
+    """
+    counts the outcome of transactions instead of writing them
+    """
+    def __init__(self):
+        self.commits = 0
+        self.aborts = 0
+        self.deadlocks = 0
+
+
+    def commit(self, trans_id, timestamp):
+        self.commits += 1
+
+
+    def abort(self, trans_id, reason):
+        self.aborts += 1
+
+
+    def deadlock(self, trans_id):
+        self.deadlocks += 1
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def run_scenario(knobs, **options):
+    """
+    options: keyword arguments of TransactionManager, like deadlock_policy
+    Return (dict): outcome, commands per second and per command latency in microseconds
+    """
+    workload = Workload(**knobs)
+    sink = CountingSink()
+    tm = make_transaction_manager(workload, sink, **options)
+    latencies = []
+    clock = time.perf_counter
+    for line in workload.commands(tm):
+        start = clock()
+        tm.get_command(line)
+        latencies.append(clock() - start)
+    tm.close()
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "commands": len(latencies),
+        "commits": sink.commits,
+        "aborts": sink.aborts,
+        "deadlocks": sink.deadlocks,
+        "commands_per_sec": round(len(latencies) / total),
+        "p50_us": round(percentile(latencies, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 1),
+    }
+
+
+def regressions(result, base, tolerance):
+    """
+    Return (list of str): how result is worse than base
+    """
+    res = []
+    for key in OUTCOME:
+        if result[key] != base[key]:
+            res.append("{} {} instead of {}".format(key, result[key], base[key]))
+    if result["commands_per_sec"] < base["commands_per_sec"] * (1 - tolerance):
+        res.append("commands/sec {} instead of {}".format(result["commands_per_sec"], base["commands_per_sec"]))
+    for key in ("p50_us", "p99_us"):
+        if result[key] > base[key] * (1 + tolerance):
+            res.append("{} {} instead of {}".format(key, result[key], base[key]))
+    return res
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Run the benchmark scenarios and compare them with the baseline")
+    arg_parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                            help="among {} (default: all)".format(", ".join(SCENARIOS)))
+    arg_parser.add_argument("--save-baseline", action="store_true", help="store the results in baseline.json")
+    arg_parser.add_argument("--tolerance", type=float, default=0.3,
+                            help="slowdown accepted before reporting a regression (default: 0.3)")
+    args = arg_parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            arg_parser.error("unknown scenario {}".format(name))
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    failed = False
+    print("{:<12}{:>9}{:>9}{:>8}{:>10}{:>14}{:>10}{:>10}".format(
+        "scenario", "commands", "commits", "aborts", "deadlocks", "commands/sec", "p50 us", "p99 us"))
+    for name in args.scenarios or SCENARIOS:
+        result = run_scenario(SCENARIOS[name])
+        print("{:<12}{commands:>9}{commits:>9}{aborts:>8}{deadlocks:>10}{commands_per_sec:>14}{p50_us:>10}{p99_us:>10}".format(
+            name, **result))
+        if args.save_baseline:
+            baseline[name] = result
+        elif name in baseline:
+            for regression in regressions(result, baseline[name], args.tolerance):
+                print("    REGRESSION: " + regression)
+                failed = True
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,85 @@
+"""
+Cost of recording a trace with snapshots, and of resuming from a snapshot
+
+    $ python3 benchmark/trace.py --variables 20 2000 100000 --intervals 1000 5000
+
+Runs a workload with --transactions over --sites sites for each number of variables, without recording
+then recording with a snapshot every N commands, and reports the commands/sec of each, the size of a
+snapshot and the time to take one and to restore one.
+"""
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Output import NullSink
+from Trace import DigestSink, TraceRecorder, TraceReader
+from workload import Workload, make_transaction_manager
+
+
+def run(workload, directory=None, interval=0):
+    """
+    Return (float, int): commands per second, and the commands of the workload
+    """
+    output = DigestSink(NullSink()) if directory else NullSink()
+    tm = make_transaction_manager(workload, output)
+    recorder = None
+    if directory:
+        recorder = TraceRecorder(directory, output, interval)
+        recorder.attach(tm, {"sites": workload.sites, "variables": workload.variables})
+    start = time.perf_counter()
+    commands = 0
+    for line in workload.commands(tm):
+        tm.get_command(line)
+        commands += 1
+    elapsed = time.perf_counter() - start
+    tm.close()
+    if recorder:
+        recorder.close()
+    return commands / elapsed, commands
+
+
+def snapshot_cost(workload, directory):
+    """
+    Return (int, float, float): bytes of the last snapshot, ms to take it and ms to restore it
+    """
+    reader = TraceReader(directory)
+    tm = make_transaction_manager(workload, NullSink())
+    reader.fast_forward(tm, len(reader.lines))
+    start = time.perf_counter()
+    data = pickle.dumps(tm.save_state(), pickle.HIGHEST_PROTOCOL)
+    save = time.perf_counter() - start
+    start = time.perf_counter()
+    tm.restore_state(pickle.loads(data))
+    restore = time.perf_counter() - start
+    return len(data), save * 1000, restore * 1000
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Throughput with trace recording and snapshot cost")
+    arg_parser.add_argument("--variables", type=int, nargs="+", default=[20, 2000, 100000])
+    arg_parser.add_argument("--intervals", type=int, nargs="+", default=[1000, 5000])
+    arg_parser.add_argument("--transactions", type=int, default=3000)
+    arg_parser.add_argument("--sites", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    print("{:>10}{:>10}{:>14}{:>16}{:>10}{:>12}{:>10}".format(
+        "variables", "interval", "commands/sec", "snapshot bytes", "take ms", "restore ms", "slowdown"))
+    for variables in args.variables:
+        workload = Workload(args.transactions, args.sites, variables, concurrency=16)
+        plain, _ = run(workload)
+        print("{:>10}{:>10}{:>14.0f}{:>16}{:>10}{:>12}{:>10}".format(variables, "-", plain, "-", "-", "-", "-"))
+        for interval in args.intervals:
+            directory = tempfile.mkdtemp()
+            try:
+                recorded, _ = run(workload, directory, interval)
+                size, save, restore = snapshot_cost(workload, directory)
+            finally:
+                shutil.rmtree(directory)
+            print("{:>10}{:>10}{:>14.0f}{:>16}{:>10.2f}{:>12.2f}{:>9.2f}x".format(
+                variables, interval, recorded, size, save, restore, plain / recorded))
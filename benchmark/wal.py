@@ -0,0 +1,62 @@
+"""
+Commit throughput with write-ahead logging at different group commit windows
+
+    $ python3 benchmark/wal.py --transactions 2000 --windows 0 1 5 20 [--async-commit]
+
+Each transaction writes two variables and commits, and waits for its group's fsync unless --async-commit. "memory" is the run without a log.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Output import NullSink
+
+
+def workload(transactions, num_variables):
+    lines = []
+    for k in range(transactions):
+        trans_id = "T" + str(k)
+        lines.append("begin({})".format(trans_id))
+        lines.append("W({},x{},{})".format(trans_id, k % num_variables + 1, k))
+        lines.append("W({},x{},{})".format(trans_id, (k + 7) % num_variables + 1, k))
+        lines.append("end({})".format(trans_id))
+    return lines
+
+
+def run(lines, wal_dir, window, checkpoint_interval, async_commit=False):
+    tm = TransactionManager(wal_dir=wal_dir, group_commit_ms=window, checkpoint_interval=checkpoint_interval,
+                            output=NullSink(), async_commit=async_commit)
+    start = time.perf_counter()
+    for line in lines:
+        tm.get_command(line)
+    tm.close()
+    elapsed = time.perf_counter() - start
+    fsyncs = sum(dm.wal.stats["fsyncs"] for dm in tm.data_manager_list) if wal_dir else 0
+    return elapsed, fsyncs
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Commit throughput per group commit window")
+    arg_parser.add_argument("--transactions", type=int, default=2000)
+    arg_parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 5, 20], help="group commit windows in ms")
+    arg_parser.add_argument("--checkpoint-interval", type=int, default=1000)
+    arg_parser.add_argument("--async-commit", action="store_true", help="report commits before their fsync")
+    arg_parser.add_argument("--dir", default=None, help="where to put the logs (default: a temporary directory)")
+    args = arg_parser.parse_args()
+
+    lines = workload(args.transactions, 20)
+    elapsed, _ = run(lines, None, 0, args.checkpoint_interval)
+    print("{:>10} {:>12.0f} commits/s".format("memory", args.transactions / elapsed))
+    for window in args.windows:
+        wal_dir = tempfile.mkdtemp(dir=args.dir)
+        try:
+            elapsed, fsyncs = run(lines, wal_dir, window, args.checkpoint_interval, args.async_commit)
+        finally:
+            shutil.rmtree(wal_dir)
+        print("{:>8}ms {:>12.0f} commits/s {:>8} fsyncs".format(window, args.transactions / elapsed, fsyncs))
@@ -0,0 +1,169 @@
+"""
+Synthetic scripts in the begin/beginRO/R/W/end/fail/recover language
+
+    $ python3 benchmark/workload.py --transactions 1000 --zipf 1.1 --failure-rate 0.01 > script.txt
+    $ python3 main.py script.txt
+
+Up to --concurrency transactions run at once, each one issues --operations reads or writes then ends.
+Variables are drawn from a Zipf distribution whose hottest keys are spread over the variable range,
+--zipf 0 draws them uniformly. The script is run while it is written, so that a transaction only
+sends its next operation once the previous one went through, as a client would.
+"""
+import argparse
+import os
+import random
+import sys
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TransactionManager import TransactionManager
+from Placement import DefaultPlacement
+from Output import NullSink
+
+
+class Workload:
+    def __init__(self, transactions=1000, sites=10, variables=20, read_ratio=0.5, zipf=0.0,
+                 read_only_fraction=0.1, failure_rate=0.0, concurrency=8, operations=4, seed=0):
+        """
+        transactions (int): transactions begun over the whole script
+        read_ratio (float): share of reads among the operations of read-write transactions
+        zipf (float): skew of the keys, 0 for uniform
+        read_only_fraction (float): share of transactions begun with beginRO
+        failure_rate (float): chance that a command is a fail or a recover instead
+        concurrency (int): transactions running at once
+        operations (int): reads and writes per transaction
+        """
+        self.transactions = transactions
+        self.sites = sites
+        self.variables = variables
+        self.read_ratio = read_ratio
+        self.read_only_fraction = read_only_fraction
+        self.failure_rate = failure_rate
+        self.concurrency = concurrency
+        self.operations = operations
+        self.seed = seed
+        keys = list(range(1, variables + 1))
+        random.Random(seed).shuffle(keys)
+        self.keys = keys
+        self.cum_weights = list(accumulate(1 / rank ** zipf for rank in range(1, variables + 1)))
+
+
+    def commands(self, tm=None):
+        """
+        yield the lines of the script
+        tm (TransactionManager): when given, a transaction waits for its last operation to run
+            before the next one, like a client waiting for an answer, and transactions aborted
+            to break or prevent a deadlock stop issuing commands
+        """
+        rand = random.Random(self.seed)
+        live = {}  # trans_id : [read_only, operations left]
+        down = set()
+        begun = 0
+        while begun < self.transactions or live:
+            if self.failure_rate and rand.random() < self.failure_rate:
+                site_id = rand.randint(1, self.sites)
+                if site_id in down:
+                    down.discard(site_id)
+                    yield "recover({})".format(site_id)
+                elif len(down) < self.sites - 1:
+                    down.add(site_id)
+                    yield "fail({})".format(site_id)
+                continue
+            if tm:
+                for trans_id in [t for t in live if t not in tm.transaction_table]:
+                    del live[trans_id]
+                ready = [t for t in live if not waiting(tm, t)]
+            else:
+                ready = list(live)
+            if begun < self.transactions and len(live) < self.concurrency:
+                trans_id = "T" + str(begun)
+                begun += 1
+                read_only = rand.random() < self.read_only_fraction
+                live[trans_id] = [read_only, self.operations]
+                yield ("beginRO({})" if read_only else "begin({})").format(trans_id)
+                continue
+            if not ready:
+                if not live:
+                    continue
+                if not down:
+                    if deadlocked(tm):
+                        # the next commands abort the victims, one per command
+                        yield "stats()"
+                        continue
+                    # every transaction waits on something no command of the script will release
+                    return
+                # the operations may wait on a down site
+                site_id = min(down)
+                down.discard(site_id)
+                yield "recover({})".format(site_id)
+                continue
+            trans_id = rand.choice(ready)
+            read_only, left = live[trans_id]
+            if not left:
+                del live[trans_id]
+                yield "end({})".format(trans_id)
+                continue
+            live[trans_id][1] -= 1
+            var_id = "x" + str(self.keys[rand.choices(range(self.variables), cum_weights=self.cum_weights)[0]])
+            if read_only or rand.random() < self.read_ratio:
+                yield "R({},{})".format(trans_id, var_id)
+            else:
+                yield "W({},{},{})".format(trans_id, var_id, rand.randint(1, 999))
+
+
+def waiting(tm, trans_id):
+    """
+    whether an operation of trans_id has not run yet, or a read left a lock request queued at a site
+    it then read from another one
+    """
+    if trans_id in tm.operation_queue.transaction_operations:
+        return True
+    for dm in tm.data_manager_list:
+        for var_id in dm.transaction_locks.get(trans_id, ()):
+            if dm.waits_for_lock(trans_id, var_id):
+                return True
+    return False
+
+
+def deadlocked(tm):
+    """
+    whether further commands would abort some of the waiting transactions: a cycle is left in the
+    wait-for graph, or a transaction waits for a lock timeout
+    """
+    return bool(tm.wait_for_graph.cycle_nodes()) or bool(getattr(tm.deadlock_policy, "blocked_since", None))
+
+
+def add_workload_arguments(arg_parser):
+    arg_parser.add_argument("--transactions", type=int, default=1000)
+    arg_parser.add_argument("--sites", type=int, default=10)
+    arg_parser.add_argument("--variables", type=int, default=20)
+    arg_parser.add_argument("--read-ratio", type=float, default=0.5)
+    arg_parser.add_argument("--zipf", type=float, default=0.0)
+    arg_parser.add_argument("--read-only-fraction", type=float, default=0.1)
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--operations", type=int, default=4)
+    arg_parser.add_argument("--seed", type=int, default=0)
+
+
+def make_transaction_manager(workload, output, **options):
+    """
+    options: further keyword arguments of TransactionManager
+    """
+    return TransactionManager(DefaultPlacement(workload.sites, workload.variables), output=output, **options)
+
+
+def workload_from_args(args):
+    return Workload(args.transactions, args.sites, args.variables, args.read_ratio, args.zipf,
+                    args.read_only_fraction, args.failure_rate, args.concurrency, args.operations, args.seed)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Write a synthetic script to standard output")
+    add_workload_arguments(arg_parser)
+    workload = workload_from_args(arg_parser.parse_args())
+    tm = make_transaction_manager(workload, NullSink())
+    for line in workload.commands(tm):
+        print(line)
+        tm.get_command(line)
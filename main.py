@@ -1,28 +1,221 @@
+import argparse
+import cProfile
+import pstats
 import sys
+import time
+from itertools import islice
 from TransactionManager import TransactionManager
+from Placement import PLACEMENTS, make_placement
+from Output import SINKS, NullSink, make_sink
+from Server import serve
+from DeadlockPolicy import POLICIES
+from ReplicaSelection import SELECTORS
+from Trace import DigestSink, TraceRecorder, TraceReader
 
+# options a trace is recorded with, its replay runs with the same
+TRACED_OPTIONS = ("sites", "variables", "placement", "replication", "max_versions", "gc_interval", "deadlock_policy",
+                  "lock_timeout", "concurrency_control", "catch_up", "replica_selection")
 
-if __name__ == '__main__':
-    trans_manager = TransactionManager()
 
-    if len(sys.argv) >= 2:
-        filename = sys.argv[1]
-        print("Reading input from file: {} ...".format(filename))
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Replicated Concurrency Control and Recovery")
+    arg_parser.add_argument("input_file", nargs="?", help="read commands from this file instead of standard input")
+    arg_parser.add_argument("--sites", type=int, default=10, help="number of sites (default: 10)")
+    arg_parser.add_argument("--variables", type=int, default=20, help="number of variables (default: 20)")
+    arg_parser.add_argument("--placement", choices=sorted(PLACEMENTS), default="default",
+                            help="default: even variables at all sites, odd xi at site i %% sites + 1; "
+                                 "hash/range: --replication copies per variable")
+    arg_parser.add_argument("--replication", type=int, default=1, help="copies per variable for hash/range placement (default: 1)")
+    arg_parser.add_argument("--max-versions", type=int, default=None,
+                            help="committed versions kept per variable copy, older snapshots cannot be read (default: all)")
+    arg_parser.add_argument("--gc-interval", type=int, default=1000,
+                            help="discard versions no read-only transaction can see every N commands, 0 to disable")
+    arg_parser.add_argument("--wal-dir", default=None,
+                            help="log committed writes of each site in this directory, a failed site reloads from it")
+    arg_parser.add_argument("--group-commit-ms", type=float, default=5,
+                            help="commits within this window share one fsync (default: 5)")
+    arg_parser.add_argument("--async-commit", action="store_true",
+                            help="report a commit before its fsync, a crash of the machine may lose the last window")
+    arg_parser.add_argument("--checkpoint-interval", type=int, default=1000,
+                            help="commits a site logs between two checkpoints (default: 1000)")
+    arg_parser.add_argument("--restore", action="store_true",
+                            help="start the sites from the checkpoints and logs left in --wal-dir by a previous run")
+    arg_parser.add_argument("--batch", type=int, default=0, metavar="N",
+                            help="parse N lines at a time before running them, and report parse and "
+                                 "execution throughput on standard error")
+    arg_parser.add_argument("--output", choices=sorted(SINKS), default="text",
+                            help="text: the usual output; jsonl: one JSON object per event; null: no output")
+    arg_parser.add_argument("--metrics", action="store_true",
+                            help="count and time the work done, the stats command then writes them")
+    arg_parser.add_argument("--stats-interval", type=int, default=0, metavar="N",
+                            help="with --metrics, write the stats every N commands")
+    arg_parser.add_argument("--profile", metavar="FILE",
+                            help="run under cProfile and write the functions sorted by cumulative time to FILE")
+    arg_parser.add_argument("--site-workers", type=int, default=0, metavar="N",
+                            help="commit, abort and dump the sites with N threads, their disk writes then overlap")
+    arg_parser.add_argument("--deadlock-policy", choices=list(POLICIES), default="detect",
+                            help="detect cycles and abort the youngest (default), or prevent them: wait-die, "
+                                 "wound-wait, or no-wait which aborts a transaction instead of letting it wait")
+    arg_parser.add_argument("--lock-timeout", type=int, default=0, metavar="N",
+                            help="with --deadlock-policy no-wait, let a transaction wait N commands for a lock")
+    arg_parser.add_argument("--concurrency-control", choices=["locking", "optimistic"], default="locking",
+                            help="strict two-phase locking (default), or optimistic: read-write transactions take "
+                                 "no lock, end validates what they read and installs what they wrote")
+    arg_parser.add_argument("--catch-up", choices=["off", "lazy", "bulk"], default="off",
+                            help="how a recovered site makes its replicated copies readable: off waits for a write "
+                                 "(default), lazy copies a peer's latest version on first read, bulk copies them "
+                                 "all at recovery")
+    arg_parser.add_argument("--replica-selection", choices=list(SELECTORS), default="first",
+                            help="which working copy a read tries first: the lowest site (default), round-robin "
+                                 "over the copies, the least-queued one, or locality to the transaction's home site")
+    arg_parser.add_argument("--record", metavar="DIR",
+                            help="write the commands run and the checksum of their output to DIR/trace.txt, "
+                                 "and snapshots of the state to DIR every --snapshot-interval commands")
+    arg_parser.add_argument("--snapshot-interval", type=int, default=1000, metavar="N",
+                            help="with --record, commands between two snapshots (default: 1000)")
+    arg_parser.add_argument("--replay", metavar="DIR",
+                            help="run the trace recorded in DIR from its last snapshot before --to, with its "
+                                 "options, then the input as usual")
+    arg_parser.add_argument("--to", type=int, default=None, metavar="N",
+                            help="with --replay, stop after the first N commands of the trace (default: all)")
+    arg_parser.add_argument("--find-divergence", metavar="DIR",
+                            help="replay the trace recorded in DIR from its snapshots and report the first "
+                                 "command whose output differs from the recording")
+    arg_parser.add_argument("--serve", metavar="ADDRESS",
+                            help="accept clients at host:port or unix:path instead of reading input, "
+                                 "all clients share the same sites")
+    args = arg_parser.parse_args()
+    if args.wal_dir and (args.record or args.replay or args.find_divergence):
+        arg_parser.error("traces keep the sites in memory, they cannot be used with --wal-dir")
+    if args.placement == "default" and args.replication != 1:
+        arg_parser.error("the default placement decides its own copies, --replication needs hash or range")
+    return args
+
+
+def read_lines(f, output):
+    """
+    stream the lines of f, standard input stops at a QUIT line
+    """
+    for line in f:
+        if f is sys.stdin and line.strip() == 'QUIT':
+            output.message("Exiting...")
+            return
+        yield line
+
+
+def run_batches(trans_manager, lines, batch_size):
+    """
+    translate then run the lines batch_size at a time
+    Return (int, float, int, float): lines parsed, parse seconds, commands run, execution seconds
+    """
+    parser = trans_manager.parser
+    num_lines, parse_time, num_commands, exec_time = 0, 0.0, 0, 0.0
+    while not parser.done_flag:
+        start = time.perf_counter()
+        batch = list(islice(lines, batch_size))
+        commands = []
         try:
-            with open(filename, 'r') as f:
-                lines = f.readlines()
-                for line in lines:
-                    # print(line)
-                    trans_manager.get_command(line)
-        except IOError:
-            print("ERROR: Cannot open file {}".format(filename))
+            parser.translate_all(batch, commands)
+        except Exception:
+            # run what came before the bad line, as line by line processing would have
+            trans_manager.run_batch(commands)
+            raise
+        parse_time += time.perf_counter() - start
+        num_lines += len(batch)
+        start = time.perf_counter()
+        trans_manager.run_batch(commands)
+        exec_time += time.perf_counter() - start
+        num_commands += len(commands)
+        if len(batch) < batch_size:
+            break
+    return num_lines, parse_time, num_commands, exec_time
+
+
+def report_throughput(num_lines, parse_time, num_commands, exec_time):
+    print("parse: {} lines in {:.3f}s ({:.0f} lines/sec)".format(
+        num_lines, parse_time, num_lines / parse_time if parse_time else 0), file=sys.stderr)
+    print("execute: {} commands in {:.3f}s ({:.0f} commands/sec)".format(
+        num_commands, exec_time, num_commands / exec_time if exec_time else 0), file=sys.stderr)
+
+
+def write_profile(profiler, path):
+    with open(path, "w") as f:
+        pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats()
+
+
+def run(trans_manager, f, batch_size):
+    if batch_size > 0:
+        report_throughput(*run_batches(trans_manager, read_lines(f, trans_manager.output), batch_size))
     else:
-        print("Reading input from standard input...")
-        print('You can quit the program by typing "QUIT"...')
-        while True:
-            line = input()
-            if line.strip() == 'QUIT':
-                print("Exiting...")
-                break
+        for line in read_lines(f, trans_manager.output):
             trans_manager.get_command(line)
-            # print(line)
+            if f is sys.stdin:
+                # answer each line typed at once
+                trans_manager.output.flush()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    reader = None
+    if args.replay or args.find_divergence:
+        reader = TraceReader(args.replay or args.find_divergence)
+        for name, value in reader.options.items():
+            setattr(args, name, value)
+    output = make_sink(args.output)
+    if args.find_divergence:
+        # only the checksums of the replayed output matter
+        report, output = output, DigestSink(NullSink())
+    elif args.record:
+        output = DigestSink(output)
+    placement = make_placement(args.placement, args.sites, args.variables, args.replication)
+    trans_manager = TransactionManager(placement, args.max_versions, args.gc_interval,
+                                       args.wal_dir, args.group_commit_ms, args.checkpoint_interval, args.restore,
+                                       output, args.metrics, args.stats_interval,
+                                       args.site_workers, args.deadlock_policy, args.lock_timeout,
+                                       args.concurrency_control, args.catch_up, args.replica_selection,
+                                       args.async_commit)
+    recorder = None
+    if args.record:
+        recorder = TraceRecorder(args.record, output, args.snapshot_interval)
+        recorder.attach(trans_manager, {name: getattr(args, name) for name in TRACED_OPTIONS})
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        if args.find_divergence:
+            position = reader.find_divergence(trans_manager, output)
+            if position is None:
+                report.message("The {} commands of the trace give the recorded output".format(len(reader.lines)))
+            else:
+                report.message("Command {} of the trace diverges: {}".format(position + 1, reader.lines[position]))
+            report.close()
+            sys.exit(0 if position is None else 1)
+        if reader:
+            position = len(reader.lines) if args.to is None else min(args.to, len(reader.lines))
+            snapshot = reader.fast_forward(trans_manager, position)
+            trans_manager.output.message("Resumed the trace from its snapshot after {} commands, replayed up to "
+                                         "command {}".format(snapshot, position))
+        if args.serve:
+            trans_manager.output.message("Serving at {} ...".format(args.serve))
+            trans_manager.output.flush()
+            serve(trans_manager, args.serve)
+        elif args.input_file:
+            filename = args.input_file
+            trans_manager.output.message("Reading input from file: {} ...".format(filename))
+            try:
+                with open(filename, 'r') as f:
+                    run(trans_manager, f, args.batch)
+            except IOError:
+                trans_manager.output.message("ERROR: Cannot open file {}".format(filename))
+        else:
+            trans_manager.output.message("Reading input from standard input...")
+            trans_manager.output.message('You can quit the program by typing "QUIT"...')
+            run(trans_manager, sys.stdin, args.batch)
+    finally:
+        trans_manager.close()
+        if recorder:
+            recorder.close()
+        if profiler:
+            profiler.disable()
+            write_profile(profiler, args.profile)
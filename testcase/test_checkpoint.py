@@ -0,0 +1,53 @@
+"""
+Values that do not fit in 64 bits, negative ones included, survive a checkpoint
+
+    $ python3 -m pytest testcase/test_checkpoint.py
+
+The input language has no minus sign, so the commands are given already translated.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Checkpoint import CheckpointFile, CheckpointRecord, write_checkpoint
+from Output import NullSink
+from TransactionManager import TransactionManager
+
+VALUES = [-2 ** 63, 2 ** 63 - 1, 2 ** 63, -2 ** 63 - 1, -99999999999999999999, 10 ** 40]
+
+
+def test_overflow_records():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "site1.ckpt")
+        records = [
+            CheckpointRecord(1, 7, 3, True, True, [(0, -2 ** 70), (2, 5)]),
+            CheckpointRecord(2, -2 ** 64, 4, False, True, []),
+            CheckpointRecord(3, 9, 1, True, False, [(0, 1)]),
+        ]
+        write_checkpoint(path, False, 5, records)
+        checkpoint = CheckpointFile(path)
+        assert [rec.versions() for rec in checkpoint] == [rec.versions() for rec in records]
+        assert [(rec.replicated, rec.available) for rec in checkpoint] == [(True, True), (False, True), (True, False)]
+        assert checkpoint.find(2).value == -2 ** 64
+        checkpoint.close()
+
+
+def test_overflow_values_restored():
+    with tempfile.TemporaryDirectory() as directory:
+        tm = TransactionManager(wal_dir=directory, checkpoint_interval=1, output=NullSink())
+        for k, value in enumerate(VALUES):
+            trans_id = "T{}".format(k)
+            tm.run_command(("begin", trans_id))
+            tm.run_command(("W", trans_id, "x2", str(value)))
+            tm.run_command(("W", trans_id, "x1", str(value)))
+            tm.run_command(("end", trans_id))
+        tm.close()
+        restored = TransactionManager(wal_dir=directory, restore=True, output=NullSink())
+        for dm in restored.data_manager_list:
+            assert dm.get_variable("x2").versions.latest() == VALUES[-1]
+            if dm.site_id == 2:
+                # every version of x1 is kept, each in the overflow section
+                assert list(dm.get_variable("x1").versions.values)[1:] == VALUES
+        restored.close()
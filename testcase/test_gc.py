@@ -0,0 +1,33 @@
+"""
+The stats report what version collection reclaimed
+
+    $ python3 -m pytest testcase/test_gc.py
+"""
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Output import TextSink
+from TransactionManager import TransactionManager
+
+
+def test_stats_change_after_gc_pass():
+    stream = io.StringIO()
+    tm = TransactionManager(output=TextSink(stream), metrics=True, gc_interval=0)
+    for k in range(3):
+        trans_id = "T{}".format(k)
+        for command in [("begin", trans_id), ("W", trans_id, "x2", str(k)), ("end", trans_id)]:
+            tm.run_command(command)
+    before = tm.metrics.snapshot(tm)["gc"]
+    assert before == {"passes": 0, "versions_reclaimed": 0, "bytes_saved": 0}
+    tm.collect_versions()
+    after = tm.metrics.snapshot(tm)["gc"]
+    # x2 has 4 versions at each of the 10 sites, only the latest is kept
+    assert after["passes"] == 1
+    assert after["versions_reclaimed"] == 30
+    assert after["bytes_saved"] > 0
+    tm.run_command(("stats",))
+    tm.close()
+    assert "-- version gc: 1 passes, 30 versions reclaimed, {} bytes saved".format(after["bytes_saved"]) in stream.getvalue()
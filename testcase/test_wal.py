@@ -0,0 +1,36 @@
+"""
+A commit is reported once its group is on disk, unless --async-commit
+
+    $ python3 -m pytest testcase/test_wal.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Output import NullSink
+from TransactionManager import TransactionManager
+
+
+def commit_with_log(async_commit):
+    """
+    Return (list of (int, int)): commits written and synced by each site right after end(T1)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        tm = TransactionManager(wal_dir=directory, group_commit_ms=200, output=NullSink(), async_commit=async_commit)
+        for command in [("begin", "T1"), ("W", "T1", "x2", "5"), ("W", "T1", "x3", "7"), ("end", "T1")]:
+            tm.run_command(command)
+        counts = [(dm.wal.written, dm.wal.synced) for dm in tm.data_manager_list]
+        tm.close()
+        return counts
+
+
+def test_commit_waits_for_fsync():
+    counts = commit_with_log(False)
+    assert all(written == synced == 1 for written, synced in counts)
+
+
+def test_async_commit_returns_before_fsync():
+    counts = commit_with_log(True)
+    assert all(written == 1 and synced == 0 for written, synced in counts)